@@ -0,0 +1,46 @@
+from lib.arpeggiator import Arpeggiator, ARP_UP
+import time
+
+# Measures how late arpeggiator steps are at 120 BPM sixteenths (125 ms per step)
+# when the clock is polled from a main loop that sleeps 50 ms per pass, as main.py
+# does, against the clock timer, and prints the timing report of each.
+
+RUN_MS = 5000
+LOOP_MS = 50
+
+
+class NullMidi:
+    """Counts the notes instead of sending them."""
+    def __init__(self):
+        self.notes = 0
+
+    def note_on(self, note, velocity=127):
+        self.notes += 1
+
+    def note_off(self, note):
+        pass
+
+
+def run(use_timer):
+    midi = NullMidi()
+    arp = Arpeggiator(midi, bpm=120, division=4, pattern=ARP_UP)
+    for finger, note in enumerate((60, 64, 67)):
+        arp.note_on(note, finger)
+    arp.start()
+    if use_timer:
+        arp.start_clock()
+    t = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), t) < RUN_MS:
+        if not use_timer:
+            arp.update()
+        time.sleep_ms(LOOP_MS)
+    arp.stop_clock()
+    arp.stop()
+    report = arp.timing_report()
+    print("%s: %d steps, %d skipped, late avg %d us, max %d us, %d notes sent" % (
+        "timer" if use_timer else "main loop", report["steps"], report["skipped"], report["avg_late_us"],
+        report["max_late_us"], midi.notes))
+
+
+run(False)
+run(True)
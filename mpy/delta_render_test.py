@@ -0,0 +1,55 @@
+from machine import Pin
+from lib.light_manager import LightManager, BLEND_ADD
+from lib.animations import *
+import time
+
+# Compares pixel writes per frame of incremental (delta) rendering against
+# redrawing the whole segment every frame, on a 25- and a 100-LED strip.
+
+FRAME_MS = 20
+
+
+def run(lm, make_animation, full_redraw):
+    anim = make_animation(lm)
+    frames = 0
+    while True:
+        if full_redraw:
+            anim.invalidate()
+        running = anim.update(lm)
+        lm.write()
+        frames += 1
+        if not running:
+            break
+        time.sleep_ms(FRAME_MS)
+    return anim.pixel_writes, frames
+
+
+tests = [
+    ("wipe", lambda lm: WipeAnimation(
+        lm.get_segment_start(0), lm.segment_length, 1000, (255, 0, 0))),
+    ("block", lambda lm: SingleBlockWipeAnimation(
+        lm.get_segment_start(0), lm.segment_length, 5, 1000, (0, 0, 255))),
+]
+
+for total_count in (25, 100):
+    lm = LightManager(Pin(9, Pin.OUT), total_count = total_count, segment_count = 5)
+    for name, make_animation in tests:
+        full_writes, full_frames = run(lm, make_animation, True)
+        delta_writes, delta_frames = run(lm, make_animation, False)
+        print("%d LEDs %s: full %.1f, delta %.1f pixel writes per frame" % (
+            total_count, name, full_writes / full_frames, delta_writes / delta_frames))
+    lm.clear()
+
+# An owner wipe drawing only its new pixels under an additive layer: the layer is
+# composited over the owner output every frame, so the segment must not build up.
+lm = LightManager(Pin(9, Pin.OUT), total_count = 25, segment_count = 5)
+lm.add_animation(WipeAnimation(0, lm.segment_length, 1000, (100, 0, 0)))
+lm.add_animation(ColorTransitionAnimation(0, lm.segment_length, 2000, (10, 0, 0)), BLEND_ADD)
+peak = 0
+while lm.animation_count:
+    lm.update()
+    peak = max(peak, lm[0][0])
+    time.sleep_ms(FRAME_MS)
+lm.update()  # The frame after the layer ended puts the owner output back
+print("owner + layer: peak red %d, expected 110; after the layers end %d, expected 100" % (peak, lm[0][0]))
+lm.clear()
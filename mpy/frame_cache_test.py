@@ -0,0 +1,25 @@
+from lib.light_manager import PixelBuffer
+from lib.animations import *
+from lib.frame_cache import FrameCache, BakedAnimation
+
+# Checks that a baked clip ends on the same pixels as the live animation, for
+# durations that are and are not a multiple of the cache's 20 ms frame interval.
+
+LENGTH = 25
+
+tests = [
+    ("wipe 400 ms", lambda: WipeAnimation(0, LENGTH, 400, (255, 0, 0))),
+    ("wipe 410 ms", lambda: WipeAnimation(0, LENGTH, 410, (255, 0, 0))),
+    ("block 400 ms", lambda: SingleBlockWipeAnimation(0, LENGTH, 5, 400, (20, 10, 30))),
+    ("block 410 ms", lambda: SingleBlockWipeAnimation(0, LENGTH, 5, 410, (20, 10, 30))),
+]
+
+cache = FrameCache()
+for name, make_animation in tests:
+    live = PixelBuffer(LENGTH)
+    anim = make_animation()
+    anim.render(live, anim.duration_ms)
+    baked = PixelBuffer(LENGTH)
+    player = BakedAnimation(0, cache.clip_for(make_animation()))
+    player.render(baked, anim.duration_ms)
+    print("%s: %s" % (name, "ok" if baked.buf == live.buf else "end state differs"))
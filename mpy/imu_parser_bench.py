@@ -0,0 +1,81 @@
+import struct
+import sys
+import time
+from lib.jy901b_parser import PacketParser, PACKET_SIZE
+
+# Measures how many JY901B packets the resynchronising parser recovers from a byte
+# stream, and how fast, against the old fixed 11-byte reads that drop a whole read
+# when it does not start on 0x55. Runs on the board or on the host:
+#   cd mpy && python imu_parser_bench.py [recorded_stream.bin]
+# Without a recording, a stream of angle and acceleration packets is generated and
+# a stray byte is inserted every NOISE_EVERY packets.
+
+PACKETS = 2000
+NOISE_EVERY = 50
+CHUNK = 64  # Bytes per read, roughly what one main loop pass finds in the UART
+
+try:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:  # Host Python
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+def packet(kind, a, b, c):
+    data = bytearray(struct.pack("<BBhhhh", 0x55, kind, a, b, c, 0))
+    data.append(sum(data) & 0xFF)
+    return data
+
+
+def generate():
+    stream = bytearray()
+    for i in range(PACKETS // 2):
+        stream += packet(0x51, i, -i, 2048)
+        stream += packet(0x53, i * 7, -i * 3, i)
+        if i % (NOISE_EVERY // 2) == 0:
+            stream.append(0xA5)
+    return stream
+
+
+def parse_fixed(stream):
+    """Old approach: read 11 bytes and keep them only if they start with 0x55."""
+    good = 0
+    for i in range(0, len(stream) - PACKET_SIZE + 1, PACKET_SIZE):
+        data = stream[i:i + PACKET_SIZE]
+        if data[0] == 0x55 and sum(data[0:10]) & 0xFF == data[10]:
+            good += 1
+    return good
+
+
+def parse_resync(stream):
+    parser = PacketParser()
+    mv = memoryview(stream)
+    for i in range(0, len(stream), CHUNK):
+        parser.feed(mv[i:i + CHUNK])
+        while parser.next() >= 0:
+            struct.unpack_from("<hhh", parser.buf, parser.offset)
+    return parser
+
+
+if len(sys.argv) > 1:
+    with open(sys.argv[1], "rb") as f:
+        stream = bytearray(f.read())
+else:
+    stream = generate()
+
+t = ticks_us()
+fixed = parse_fixed(stream)
+fixed_us = ticks_diff(ticks_us(), t)
+t = ticks_us()
+parser = parse_resync(stream)
+resync_us = ticks_diff(ticks_us(), t)
+
+print("%d bytes" % len(stream))
+print("fixed reads: %d packets, %d us" % (fixed, fixed_us))
+print("resync:      %d packets, %d us, %.0f packets/s, %d checksum errors, %d bytes skipped" % (
+    parser.packets, resync_us, parser.packets * 1000000 / max(resync_us, 1), parser.checksum_errors,
+    parser.skipped))
@@ -1,106 +1,188 @@
-from neopixel import NeoPixel
-from time import ticks_diff, ticks_ms
-
-from light_manager import Animation, lerp_color
+from lib.light_manager import Animation, PixelBuffer, lerp_into, pack_color
 
 
 class WipeAnimation(Animation):
-    def __init__(self, start_index: int, length: int, duration_ms: int, color: tuple, reverse=False):
-        super().__init__(start_index, length, duration_ms)
-        self.color = color
-        self.reverse = reverse
-
-    def update(self, np: NeoPixel) -> bool:
-        elapsed = ticks_diff(ticks_ms(), self.start_time)
-        step = int((elapsed / self.duration_ms) * self.length)
+    """
+    Wipes a color across the segment. After the first frame only the pixels the
+    wipe has newly reached are written.
+    """
+    __slots__ = ("color", "reverse", "packed", "repack", "drawn")
 
-        if step >= self.length:
-            for i in range(self.length):
-                np[self.start_index + i] = self.color
-            return False  # Done
+    def init_state(self):
+        self.packed = None  # Color in strip byte order, packed on first update
 
-        for i in range(self.length):
-            idx = self.length - 1 - i if self.reverse else i
-            np[self.start_index + idx] = self.color if i <= step else (0, 0, 0)
-        return True
+    def setup(self, start_index: int, length: int, duration_ms: int, color: tuple, reverse=False):
+        super().setup(start_index, length, duration_ms)
+        self.color = color
+        self.reverse = reverse
+        self.repack = True
+
+    def invalidate(self):
+        self.drawn = -1  # Number of pixels painted so far, -1 before the first full draw
+
+    def bake_key(self):
+        return WipeAnimation, self.length, self.duration_ms, self.color, self.reverse
+
+    def _fill(self, np: PixelBuffer, first: int, end: int, packed):
+        """Fill the wipe positions [first, end), mapped to LED indices by the direction."""
+        if end <= first:
+            return
+        if self.reverse:
+            np.fill_range(self.start_index + self.length - end, end - first, packed)
+        else:
+            np.fill_range(self.start_index + first, end - first, packed)
+        self.pixel_writes += end - first
+
+    def render(self, np: PixelBuffer, elapsed: int) -> bool:
+        bpp = np.bpp
+        if self.packed is None:
+            self.packed = bytearray(bpp)
+        if self.repack:
+            pack_color(self.color, np.ORDER, bpp, self.packed)
+            self.repack = False
+        length = self.length
+
+        step = elapsed * length // self.duration_ms if self.duration_ms else length
+        painted = step + 1 if step < length else length
+
+        if self.drawn < 0:
+            self._fill(np, 0, painted, self.packed)
+            self._fill(np, painted, length, None)
+        else:
+            # Only paint the pixels reached since the last frame
+            self._fill(np, self.drawn, painted, self.packed)
+        if painted > self.drawn:
+            self.drawn = painted
+        return step < length  # False when done
 
 
 class SingleBlockWipeAnimation(Animation):
     """
     Sends a single block flying across the segment, starting before
     the segment (off-screen) and ending off-screen beyond the segment.
+    After the first frame only the pixels the block enters or leaves are written.
     """
+    __slots__ = ("block_length", "color", "reverse", "packed", "repack", "travel_length", "drawn", "drawn_first")
 
-    def __init__(self, start_index: int, segment_length: int, block_length: int, duration_ms: int, color: tuple,
-                 reverse=False):
+    def init_state(self):
+        self.packed = None  # Color in strip byte order, packed on first update
+
+    def setup(self, start_index: int, segment_length: int, block_length: int, duration_ms: int, color: tuple,
+              reverse=False):
         # The "length" in Animation is the visible segment length
-        super().__init__(start_index, segment_length, duration_ms)
+        super().setup(start_index, segment_length, duration_ms)
         self.block_length = block_length
         self.color = color
         self.reverse = reverse
+        self.repack = True
 
         # Total travel distance = segment length + block length (start off-screen to end off-screen)
         self.travel_length = self.length + self.block_length
 
-    def update(self, np) -> bool:
-        elapsed = ticks_diff(ticks_ms(), self.start_time)
-        progress = elapsed / self.duration_ms
-
-        if progress >= 1.0:
+    def invalidate(self):
+        self.drawn = False  # Whether the segment holds the block drawn at drawn_first
+        self.drawn_first = 0
+
+    def bake_key(self):
+        return (SingleBlockWipeAnimation, self.length, self.block_length, self.duration_ms, self.color,
+                self.reverse)
+
+    def _paint(self, np: PixelBuffer, first: int, end: int, packed):
+        """Fill the block positions [first, end) that are inside the segment, None turns them off."""
+        if first < 0:
+            first = 0
+        if end > self.length:
+            end = self.length
+        if end <= first:
+            return
+        if self.reverse:
+            np.fill_range(self.start_index + first, end - first, packed)
+        else:
+            np.fill_range(self.start_index + self.length - end, end - first, packed)
+        self.pixel_writes += end - first
+
+    def render(self, np: PixelBuffer, elapsed: int) -> bool:
+        if self.packed is None:
+            self.packed = bytearray(np.bpp)
+        if self.repack:
+            pack_color(self.color, np.ORDER, np.bpp, self.packed)
+            self.repack = False
+        block = self.block_length
+
+        if elapsed >= self.duration_ms:
             # Clear the segment LEDs at the end (block fully off-screen)
-            for i in range(self.length):
-                idx = self.start_index + i if self.reverse else self.start_index + (self.length - 1 - i)
-                np[idx] = (0, 0, 0)
+            if self.drawn:
+                self._paint(np, self.drawn_first, self.drawn_first + block, None)
+            else:
+                self._paint(np, 0, self.length, None)
+            self.drawn = True
+            self.drawn_first = self.length
             return False  # Animation finished
 
         # Always calculate progress left-to-right, block starting at -block_length
-        block_start_pos = int(progress * self.travel_length) - self.block_length
-
-        # Clear all LEDs in segment first
-        for i in range(self.length):
-            idx = self.start_index + i if self.reverse else self.start_index + (self.length - 1 - i)
-            np[idx] = (0, 0, 0)
-
-        # Draw block only inside visible segment bounds
-        for i in range(self.block_length):
-            led_pos = block_start_pos + i
-            if 0 <= led_pos < self.length:
-                idx = self.start_index + led_pos if self.reverse else self.start_index + (self.length - 1 - led_pos)
-                np[idx] = self.color
+        first = elapsed * self.travel_length // self.duration_ms - block
+
+        if not self.drawn:
+            # Clear all LEDs in segment, then draw the block inside the visible bounds
+            self._paint(np, 0, self.length, None)
+            self._paint(np, first, first + block, self.packed)
+        elif first != self.drawn_first:
+            old = self.drawn_first
+            if first > old:
+                # Moved forward: clear the trailing pixels it left, draw the ones it entered
+                self._paint(np, old, min(first, old + block), None)
+                self._paint(np, max(first, old + block), first + block, self.packed)
+            else:
+                self._paint(np, max(first + block, old), old + block, None)
+                self._paint(np, first, min(old, first + block), self.packed)
+        self.drawn = True
+        self.drawn_first = first
 
         return True  # Animation ongoing
 
 
 class ColorTransitionAnimation(Animation):
     """
-    Fades segment to target color over time, or instantly if specified
+    Fades segment to target color over time, or instantly if specified.
+    Blending is done in 8.8 fixed point directly on the strip's byte buffer.
     """
+    __slots__ = ("target_color", "start_bytes", "target_pixels", "packed", "initialized")
 
-    def __init__(self, start_index: int, segment_length: int, duration_ms: int, target_color: tuple):
-        super().__init__(start_index, segment_length, duration_ms)
+    def init_state(self):
+        self.start_bytes = None  # Allocated on first update, reused while the segment size is unchanged
+        self.target_pixels = None
+        self.packed = None
+
+    def setup(self, start_index: int, segment_length: int, duration_ms: int, target_color: tuple):
+        super().setup(start_index, segment_length, duration_ms)
         self.target_color = target_color
-        self.start_colors = [(0, 0, 0)] * segment_length  # We'll sample on first update
-        self.initialized = False
+        self.initialized = False  # We'll sample on first update
 
-    def update(self, np):
+    def render(self, np, elapsed: int):
+        bpp = np.bpp
+        n = self.length * bpp
         if not self.initialized:
-            # Sample current colors of the segment
-            self.start_colors = [np[self.start_index + i] for i in range(self.length)]
+            if self.start_bytes is None or len(self.start_bytes) != n:
+                self.start_bytes = bytearray(n)
+                self.target_pixels = PixelBuffer(self.length, bpp, np.ORDER)
+                self.packed = bytearray(bpp)
+            # Sample current colors of the segment, already in strip byte order
+            np.read_range(self.start_index, self.length, self.start_bytes)
+            packed = pack_color(self.target_color, np.ORDER, bpp, self.packed)
+            self.target_pixels.fill_range(0, self.length, packed)
             self.initialized = True
 
             if self.duration_ms == 0:
                 # Immediate fill - set target color and finish right away
-                for i in range(self.length):
-                    np[self.start_index + i] = self.target_color
+                np.blit(self.start_index, self.target_pixels.buf)
+                self.pixel_writes += self.length
                 return False  # Animation done immediately
 
-        elapsed = ticks_diff(ticks_ms(), self.start_time)
-        t = min(elapsed / self.duration_ms, 1.0)
-
-        for i in range(self.length):
-            c = lerp_color(self.start_colors[i], self.target_color, t)
-            np[self.start_index + i] = c
-
-        if t >= 1.0:
+        self.pixel_writes += self.length
+        if elapsed >= self.duration_ms:
+            np.blit(self.start_index, self.target_pixels.buf)
             return False  # Finished fading
+
+        t8 = (elapsed << 8) // self.duration_ms if elapsed > 0 else 0
+        lerp_into(np.buf, self.start_index * bpp, self.start_bytes, self.target_pixels.buf, t8)
         return True
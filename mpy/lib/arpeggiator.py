@@ -0,0 +1,327 @@
+from micropython import const
+from machine import Timer
+from time import ticks_us, ticks_diff, ticks_add
+from random import getrandbits
+
+# Arpeggio patterns
+ARP_UP = const(0)
+ARP_DOWN = const(1)
+ARP_UP_DOWN = const(2)
+ARP_RANDOM = const(3)
+
+# Ticks per quarter note, same resolution as MIDI clock
+PPQN = const(24)
+_CLOCK_TIMEOUT_US = const(500000)  # Back to the internal clock after this long without MIDI clock
+
+
+class Arpeggiator:
+    """
+    Tick-based arpeggiator and step sequencer for held notes.
+
+    The engine runs on a single integer tick counter at 24 PPQN. The tick counter
+    is advanced either by the internal BPM clock (`update`, called from a hardware
+    timer with `start_clock`) or by incoming MIDI clock messages (`clock`). Ticks
+    the internal clock could not process in time are skipped rather than replayed,
+    so a stall never sends a burst of notes. The order in which held notes are played is kept in a
+    precomputed step table that is only rebuilt when a note is pressed or released,
+    so every tick costs O(1) regardless of how many fingers are held.
+
+    Steps are sent through a BLEMidi instance. An optional `on_step` callback is
+    called as on_step(note_number, finger) for every step, which can be used to
+    trigger LightManager segment animations.
+    """
+
+    def __init__(self, midi, bpm: int = 120, division: int = 4, pattern: int = ARP_UP, gate: int = 50,
+                 velocity: int = 127, max_notes: int = 5, on_step=None):
+        """
+        Initializes the Arpeggiator in a stopped state.
+
+        Args:
+            midi (BLEMidi): MIDI output used for the generated notes.
+            bpm (int): Tempo of the internal clock in beats per minute.
+            division (int): Steps per quarter note (must divide 24, e.g. 4 for sixteenth notes).
+            pattern (int): One of ARP_UP, ARP_DOWN, ARP_UP_DOWN, ARP_RANDOM.
+            gate (int): Note length as a percentage of the step length (1-100).
+            velocity (int): MIDI velocity of the generated notes.
+            max_notes (int): Maximum number of notes that can be held at once.
+            on_step (callable): Optional callback called as on_step(note_number, finger).
+        """
+        self.midi = midi
+        self.velocity = velocity
+        self.on_step = on_step
+        self.external_clock = False
+        self.running = False
+
+        # Held notes sorted ascending, with the finger that holds each one
+        self._held = bytearray(max_notes)
+        self._fingers = bytearray(max_notes)
+        self._held_count = 0
+
+        # Precomputed step table of indices into _held, rebuilt on note changes only
+        self._steps = bytearray(max(1, 2 * max_notes - 2))
+        self._step_count = 0
+        self._step_pos = 0
+
+        self.tick = 0
+        self._next_step_tick = 0
+        self._gate_off_tick = -1
+        self._playing = -1  # Note number currently sounding, -1 for none
+        self._due_us = 0
+        self._clock_us = 0  # Time of the latest MIDI clock message
+        self._timer = None
+
+        # Timing statistics, lateness of each step relative to its ideal time
+        self.steps_played = 0
+        self.steps_skipped = 0
+        self._late_sum_us = 0
+        self._late_max_us = 0
+
+        self.pattern = pattern
+        self.set_division(division)
+        self.set_gate(gate)
+        self.set_bpm(bpm)
+
+    def set_bpm(self, bpm: int):
+        """Set the tempo of the internal clock."""
+        self.bpm = bpm
+        self._tick_us = 60000000 // (bpm * PPQN)
+
+    def set_division(self, division: int):
+        """Set the number of steps per quarter note."""
+        if PPQN % division:
+            raise ValueError("division must divide 24")
+        self._step_ticks = PPQN // division
+
+    def set_gate(self, gate: int):
+        """Set the note length as a percentage of the step length."""
+        self._gate_ticks = max(1, min(self._step_ticks * gate // 100, self._step_ticks))
+
+    def set_pattern(self, pattern: int):
+        """Select the arpeggio pattern and rebuild the step table."""
+        self.pattern = pattern
+        self._build_steps()
+
+    def note_on(self, note_number: int, finger: int = 0):
+        """
+        Add a held note. The step table is rebuilt here instead of on every tick.
+
+        Args:
+            note_number (int): MIDI note number (0-127).
+            finger (int): Index of the finger holding the note, passed on to on_step.
+        """
+        held = self._held
+        count = self._held_count
+        if count >= len(held):
+            return
+        for i in range(count):
+            if held[i] == note_number:
+                return
+        # Insertion sort keeps the held notes ascending
+        i = count
+        while i > 0 and held[i - 1] > note_number:
+            held[i] = held[i - 1]
+            self._fingers[i] = self._fingers[i - 1]
+            i -= 1
+        held[i] = note_number
+        self._fingers[i] = finger
+        self._held_count = count + 1
+        self._build_steps()
+
+    def note_off(self, note_number: int):
+        """Remove a held note. The sounding note is left to finish its gate."""
+        held = self._held
+        count = self._held_count
+        for i in range(count):
+            if held[i] == note_number:
+                for j in range(i, count - 1):
+                    held[j] = held[j + 1]
+                    self._fingers[j] = self._fingers[j + 1]
+                self._held_count = count - 1
+                self._build_steps()
+                return
+
+    def _build_steps(self):
+        """Fill the step table for the current pattern and held notes."""
+        n = self._held_count
+        steps = self._steps
+        if self.pattern == ARP_DOWN:
+            for i in range(n):
+                steps[i] = n - 1 - i
+            count = n
+        elif self.pattern == ARP_UP_DOWN and n > 2:
+            for i in range(n):
+                steps[i] = i
+            for i in range(n - 2):
+                steps[n + i] = n - 2 - i
+            count = 2 * n - 2
+        else:
+            # ARP_UP, short ARP_UP_DOWN, and ARP_RANDOM (which only needs the count)
+            for i in range(n):
+                steps[i] = i
+            count = n
+        self._step_count = count
+        if self._step_pos >= count:
+            self._step_pos = 0
+
+    def start(self):
+        """Start from tick 0. Called on MIDI Start or when starting the internal clock."""
+        self.tick = 0
+        self._next_step_tick = 0
+        self._step_pos = 0
+        self._due_us = ticks_us()
+        self.running = True
+
+    def stop(self):
+        """Stop the arpeggiator and silence the sounding note."""
+        self.running = False
+        self._release()
+
+    def _release(self):
+        if self._playing >= 0:
+            self.midi.note_off(self._playing)
+            self._playing = -1
+        self._gate_off_tick = -1
+
+    def _advance(self, due_us: int):
+        """Process one tick. due_us is the ideal time of this tick, used for the timing statistics."""
+        tick = self.tick
+        if tick == self._gate_off_tick:
+            self._release()
+        if tick == self._next_step_tick:
+            self._next_step_tick = tick + self._step_ticks
+            if self._step_count:
+                self._step(tick, due_us)
+        self.tick = tick + 1
+
+    def _skip(self, ticks: int):
+        """Jump the tick counter forward, ending a due gate but playing none of the skipped steps."""
+        tick = self.tick + ticks
+        if 0 <= self._gate_off_tick < tick:
+            self._release()
+        while self._next_step_tick < tick:
+            self._next_step_tick += self._step_ticks
+            if self._step_count:
+                self.steps_skipped += 1
+        self.tick = tick
+
+    def _step(self, tick: int, due_us: int):
+        if self.pattern == ARP_RANDOM:
+            count = self._held_count
+            if not count:
+                return  # The last note was released while the step table was being rebuilt
+            index = getrandbits(8) % count
+        else:
+            index = self._steps[self._step_pos]
+            self._step_pos += 1
+            if self._step_pos >= self._step_count:
+                self._step_pos = 0
+
+        self._release()
+        note = self._held[index]
+        self.midi.note_on(note, self.velocity)
+        self._playing = note
+        self._gate_off_tick = tick + self._gate_ticks
+
+        late = ticks_diff(ticks_us(), due_us)
+        self.steps_played += 1
+        self._late_sum_us += late
+        if late > self._late_max_us:
+            self._late_max_us = late
+
+        if self.on_step:
+            self.on_step(note, self._fingers[index])
+
+    def update(self):
+        """
+        Advance the internal clock, called by the clock timer or from the main loop.
+        Does nothing when following an external MIDI clock, unless no clock message
+        arrived for half a second, then it falls back to the internal clock. If whole
+        ticks were missed, they are counted and skipped and only the current tick is played.
+        """
+        if not self.running:
+            return
+        now = ticks_us()
+        if self.external_clock:
+            if ticks_diff(now, self._clock_us) < _CLOCK_TIMEOUT_US:
+                return
+            self.external_clock = False
+            self._due_us = now  # Carry on from the current tick
+        late = ticks_diff(now, self._due_us)
+        if late < 0:
+            return
+        period = self._tick_us
+        if late >= period:
+            missed = late // period
+            self._skip(missed)
+            self._due_us = ticks_add(self._due_us, missed * period)
+        self._advance(self._due_us)
+        self._due_us = ticks_add(self._due_us, period)
+
+    def start_clock(self, timer_id: int = 3, period_ms: int = 2):
+        """
+        Run the internal clock from a hardware timer instead of the main loop. The timer
+        polls every period_ms, so a step is at most that late plus the scheduling delay,
+        whatever the tempo and however long a main loop pass takes.
+        """
+        self.stop_clock()
+        self._timer = Timer(timer_id)
+        self._timer.init(mode=Timer.PERIODIC, period=period_ms, callback=self._tick)
+
+    def stop_clock(self):
+        """Stop the clock timer, the main loop calls update again afterwards."""
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, timer):
+        self.update()
+
+    def clock(self):
+        """Advance by one tick on an incoming MIDI clock message (24 per quarter note)."""
+        self._clock_us = ticks_us()
+        if self.running:
+            self._advance(self._clock_us)
+
+    def handle_realtime(self, status: int):
+        """
+        Handler for BLEMidi.set_realtime_handler. Switches to the external clock on
+        MIDI Clock, Start and Continue, and back to the internal clock on Stop or when
+        the clock messages stop arriving.
+        """
+        if status == 0xF8:
+            self.external_clock = True
+            self.clock()
+        elif status == 0xFA:
+            self.external_clock = True
+            self._clock_us = ticks_us()
+            self.start()
+        elif status == 0xFB:
+            self.external_clock = True
+            self._clock_us = ticks_us()
+            self.running = True
+        elif status == 0xFC:
+            self.stop()
+            self.external_clock = False
+
+    def timing_report(self):
+        """
+        Get the measured step timing accuracy.
+
+        Returns:
+            dict: Number of steps played and skipped, and the average and maximum
+                  lateness of a step relative to its ideal time in microseconds.
+        """
+        steps = self.steps_played
+        return {
+            "steps": steps,
+            "skipped": self.steps_skipped,
+            "avg_late_us": self._late_sum_us // steps if steps else 0,
+            "max_late_us": self._late_max_us,
+        }
+
+    def reset_timing(self):
+        """Clear the timing statistics."""
+        self.steps_played = 0
+        self.steps_skipped = 0
+        self._late_sum_us = 0
+        self._late_max_us = 0
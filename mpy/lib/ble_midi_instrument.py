@@ -5,6 +5,13 @@ from time import sleep
 # IRQ constants
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
+_IRQ_GATTS_WRITE = const(3)
+
+# MIDI real-time status bytes
+MIDI_CLOCK = const(0xF8)
+MIDI_START = const(0xFA)
+MIDI_CONTINUE = const(0xFB)
+MIDI_STOP = const(0xFC)
 
 # MIDI BLE UUIDs
 _MIDI_SERVICE_UUID = bluetooth.UUID("03B80E5A-EDE8-4B33-A751-6CE34EC4C700")
@@ -16,7 +23,7 @@ MIDI_SERVICE = (
     (
         (
             _MIDI_IO_CHAR_UUID,
-            bluetooth.FLAG_READ | bluetooth.FLAG_WRITE | bluetooth.FLAG_NOTIFY,
+            bluetooth.FLAG_READ | bluetooth.FLAG_WRITE | bluetooth.FLAG_WRITE_NO_RESPONSE | bluetooth.FLAG_NOTIFY,
         ),
     ),
 )
@@ -95,6 +102,8 @@ class BLEMidi:
         self._ble.irq(self._irq)
         ((self._handle,),) = self._ble.gatts_register_services((MIDI_SERVICE,))
         self._connections = set()
+        self._realtime_handler = None
+        self._note_handler = None
 
         # Start advertising
         adv_data = advertising_payload(services=[_MIDI_SERVICE_UUID])
@@ -121,6 +130,74 @@ class BLEMidi:
             scan_data = advertising_payload(name="Pico-W-MIDI")
             self._ble.gap_advertise(30000, adv_data=adv_data, resp_data=scan_data)
             print("Disconnected")
+        elif event == _IRQ_GATTS_WRITE:
+            conn, attr_handle = data
+            if attr_handle == self._handle:
+                self._parse_packet(self._ble.gatts_read(self._handle))
+
+    def set_realtime_handler(self, handler):
+        """
+        Register a callback for incoming MIDI real-time messages (clock, start, continue, stop).
+
+        Args:
+            handler (callable): Called as handler(status) with the real-time status byte,
+                e.g. MIDI_CLOCK. Pass None to remove the handler.
+        """
+        self._realtime_handler = handler
+
+    def set_note_handler(self, handler):
+        """
+        Register a callback for incoming Note On and Note Off messages.
+
+        Args:
+            handler (callable): Called as handler(status, note, velocity) with the status
+                byte including the channel. Pass None to remove the handler.
+        """
+        self._note_handler = handler
+
+    def _parse_packet(self, data):
+        """
+        Walk an incoming BLE-MIDI packet and dispatch the messages it contains.
+
+        A packet is a header byte followed by messages, each status byte preceded by a
+        timestamp byte (bit 7 set). Data bytes (bit 7 clear) either follow their status
+        or use running status. Real-time messages may be interleaved anywhere after a
+        timestamp byte, even between the data bytes of a message: the running status and
+        a pending data byte are kept, and the interrupted message continues after it.
+
+        Args:
+            data (bytes): Raw characteristic value written by the central.
+        """
+        n = len(data)
+        i = 1  # Skip header byte
+        status = 0  # Running status
+        first = -1  # First data byte of the current message, -1 before it arrived
+        while i < n:
+            b = data[i]
+            if b & 0x80:
+                # Timestamp byte, the next byte is a status byte or running-status data
+                i += 1
+                if i >= n:
+                    break
+                b = data[i]
+                if b >= 0xF8:
+                    if self._realtime_handler:
+                        self._realtime_handler(b)
+                    i += 1
+                    continue
+                if b & 0x80:
+                    status = b
+                    first = -1
+                    i += 1
+                    continue
+            # Data byte of the current message, note messages take two
+            if first < 0:
+                first = b
+            else:
+                if self._note_handler and status & 0xE0 == 0x80:
+                    self._note_handler(status, first, b)
+                first = -1
+            i += 1
 
     def send(self, midi_msg):
         """
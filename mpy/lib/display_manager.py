@@ -1,42 +1,419 @@
 # display_manager.py
 from micropython import const
+import framebuf
 import ssd1306
-from machine import I2C
+from machine import I2C, Timer
+from time import ticks_us, ticks_diff
 
 # Constants for layout
 _HEADER_HEIGHT = const(16)
 _FOOTER_HEIGHT = const(8)
 _PADDING = const(2)
 
+
+class TextWidget:
+    """
+    A line of text in a fixed rectangle of the display. It keeps its last text and only
+    redraws its own rectangle when the text changes.
+    """
+    def __init__(self, display, x: int, y: int, width: int, height: int, inverted: bool = False,
+                 precision: int = 1):
+        """
+        - display: SSD1306 to draw on.
+        - x, y, width, height: Rectangle owned by the widget.
+        - inverted: Dark text on a lit background, as in the header bar.
+        - precision: Decimal places shown when a number is set.
+        """
+        self.display = display
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.inverted = inverted
+        self.set_precision(precision)
+        self.text = None  # Nothing drawn yet
+
+    def set_precision(self, precision: int):
+        """Set the decimal places shown for numbers, redrawn on the next set."""
+        self._format = "%." + str(precision) + "f"
+        self.text = None
+
+    def set(self, value) -> bool:
+        """Show a string or a number. Returns True if the widget was redrawn."""
+        if not isinstance(value, str):
+            value = self._format % value
+        if value == self.text:
+            return False
+        self.text = value
+        self.draw()
+        return True
+
+    def draw(self):
+        """Redraw the widget's rectangle."""
+        fg = 0 if self.inverted else 1
+        self.display.fill_rect(self.x, self.y, self.width, self.height, 1 - fg)
+        self.display.text(self.text, self.x + _PADDING, self.y, fg)
+
+
+# Pages
+PAGE_PLAY = const(0)  # Header, then text lines or keyboard, and footer
+PAGE_GRAPH = const(1)  # Header above a sweeping sensor graph
+
+_WHITE_WIDTH = const(9)  # Keyboard geometry, two octaves of white keys fit in 128 columns
+_BLACK_WIDTH = const(5)
+_KEY_HEIGHT = const(30)
+_BLACK_HEIGHT = const(18)
+_MARKER_SIZE = const(3)
+_WHITE_INDEX = (0, -1, 1, -1, 2, 3, -1, 4, -1, 5, -1, 6)  # White key number of each pitch class, -1 for black
+
+
+def _sprite(width: int, height: int, color: int):
+    """Create a solid rectangle bitmap for blitting."""
+    fb = framebuf.FrameBuffer(bytearray(width * ((height + 7) // 8)), width, height, framebuf.MONO_VLSB)
+    fb.fill(color)
+    return fb
+
+
+class KeyboardWidget:
+    """
+    Two octaves of piano keyboard, marking the keys the fingers are mapped to and
+    filling the held ones.
+
+    The empty keyboard and the key sprites are rendered once into FrameBuffers, so a
+    redraw is one blit of the background and a blit per mapped key. Unchanged keys
+    produce identical bytes, so the display's partial flush only sends changed keys.
+    """
+    def __init__(self, display, x: int, y: int):
+        """
+        - display: SSD1306 to draw on.
+        - x, y: Top left corner, the widget is 14 white keys wide plus the marker row.
+        """
+        self.display = display
+        self.x = x
+        self.y = y
+        self.width = 14 * _WHITE_WIDTH + 1
+        self.height = _KEY_HEIGHT + 2 + _MARKER_SIZE
+        # Left edge of each of the 24 keys, and whether it is black
+        self._key_x = bytearray(24)
+        self._black = bytearray(24)
+        for i in range(24):
+            white = _WHITE_INDEX[i % 12]
+            octave = (i // 12) * 7
+            if white >= 0:
+                self._key_x[i] = (octave + white) * _WHITE_WIDTH
+            else:
+                self._black[i] = 1
+                self._key_x[i] = (octave + _WHITE_INDEX[i % 12 - 1] + 1) * _WHITE_WIDTH - _BLACK_WIDTH // 2
+
+        self._background = framebuf.FrameBuffer(bytearray(self.width * ((self.height + 7) // 8)),
+                                                self.width, self.height, framebuf.MONO_VLSB)
+        bg = self._background
+        bg.fill(0)
+        for i in range(24):
+            if not self._black[i]:
+                bg.rect(self._key_x[i], 0, _WHITE_WIDTH + 1, _KEY_HEIGHT, 1)
+        for i in range(24):
+            if self._black[i]:
+                bg.fill_rect(self._key_x[i], 0, _BLACK_WIDTH, _BLACK_HEIGHT, 1)
+        # Held white keys fill below the black keys, held black keys are hollowed out
+        self._white_held = _sprite(_WHITE_WIDTH - 1, _KEY_HEIGHT - _BLACK_HEIGHT - 3, 1)
+        self._black_held = _sprite(_BLACK_WIDTH - 2, _BLACK_HEIGHT - 2, 0)
+        self._marker = _sprite(_MARKER_SIZE, _MARKER_SIZE, 1)
+
+        self.notes = None
+        self.held = -1
+
+    def invalidate(self):
+        """Draw the keyboard again on the next set."""
+        self.notes = None
+
+    def set(self, notes: list, held: int) -> bool:
+        """
+        Show the fingers' MIDI notes and which of them are held, as a bit mask by finger.
+        Returns True if the widget was redrawn.
+        """
+        if held == self.held and notes == self.notes:
+            return False
+        self.notes = notes
+        self.held = held
+        self.draw()
+        return True
+
+    def draw(self):
+        """Compose the keyboard from the cached bitmaps."""
+        d = self.display
+        x0 = self.x
+        y0 = self.y
+        d.blit(self._background, x0, y0)
+        notes = self.notes
+        if not notes:
+            return
+        base = min(notes) // 12 * 12  # Window starts at the C below the lowest note
+        for finger in range(len(notes)):
+            key = notes[finger] - base
+            if key >= 24:
+                continue
+            x = x0 + self._key_x[key]
+            if self._black[key]:
+                d.blit(self._marker, x + 1, y0 + _KEY_HEIGHT + 2)
+                if self.held >> finger & 1:
+                    d.blit(self._black_held, x + 1, y0 + 1)
+            else:
+                d.blit(self._marker, x + 3, y0 + _KEY_HEIGHT + 2)
+                if self.held >> finger & 1:
+                    d.blit(self._white_held, x + 1, y0 + _BLACK_HEIGHT + 1)
+
+
+class GraphWidget:
+    """
+    Sweeping strip chart with one lane per signal, for watching sensor values live.
+
+    The chart area of the display is a ring of columns with a write cursor, like an
+    oscilloscope sweep: each sample overwrites the oldest column at the cursor with one
+    short vertical segment per lane and blanks the column after it as a gap marking the
+    newest sample. Nothing else is redrawn, so a sample costs the same whatever the chart
+    size and the page diff only sends the two changed columns. An optional threshold per
+    lane is drawn as a dotted line.
+    """
+    def __init__(self, display, x: int, y: int, width: int, lanes: int, lane_height: int = 8):
+        """
+        - display: SSD1306 to draw on.
+        - x, y: Top left corner.
+        - width: Number of samples shown.
+        - lanes: Number of signals, stacked from the top.
+        - lane_height: Pixel height of a lane, its bottom row separates it from the next lane.
+        """
+        self.display = display
+        self.x = x
+        self.y = y
+        self.width = width
+        self.lanes = lanes
+        self.lane_height = lane_height
+        self.height = lanes * lane_height
+        self._lo = [0] * lanes
+        self._span = [1] * lanes
+        self._threshold_y = [-1] * lanes
+        self._last_y = bytearray(lanes)  # Row of the previous sample, to join samples with a segment
+        for lane in range(lanes):
+            self.set_range(lane, 0, 100)
+        self._count = 0
+        self._cursor = 0  # Column the next sample is drawn in
+
+    def set_range(self, lane: int, lo, hi, threshold=None):
+        """Set the values shown at the bottom and top of a lane, and an optional threshold line."""
+        self._lo[lane] = lo
+        self._span[lane] = (hi - lo) or 1
+        self._threshold_y[lane] = -1 if threshold is None else self._row(lane, threshold)
+        self._last_y[lane] = self._row(lane, lo)
+
+    def _row(self, lane: int, value) -> int:
+        """Chart row of a value in a lane, clamped to the lane."""
+        top = self.lane_height - 2
+        level = int((value - self._lo[lane]) * top // self._span[lane])
+        if level < 0:
+            level = 0
+        elif level > top:
+            level = top
+        return lane * self.lane_height + top - level
+
+    def clear(self):
+        """Empty the chart and restart the sweep at the left edge."""
+        self.display.fill_rect(self.x, self.y, self.width, self.height, 0)
+        self._cursor = 0
+
+    def add(self, values):
+        """Draw one sample per lane in the column at the cursor and move the cursor on."""
+        d = self.display
+        top = self.y
+        col = self.x + self._cursor
+        d.vline(col, top, self.height, 0)
+        dotted = not self._count & 3
+        self._count += 1
+        for lane in range(min(len(values), self.lanes)):
+            y = self._row(lane, values[lane])
+            prev = self._last_y[lane]
+            if prev < y:
+                d.vline(col, top + prev, y - prev + 1, 1)
+            else:
+                d.vline(col, top + y, prev - y + 1, 1)
+            self._last_y[lane] = y
+            if dotted and self._threshold_y[lane] >= 0:
+                d.pixel(col, top + self._threshold_y[lane], 1)
+        cursor = self._cursor + 1
+        if cursor == self.width:
+            cursor = 0
+        self._cursor = cursor
+        if cursor:  # At the wrap the gap would widen the flush to the whole chart, skip it
+            d.vline(self.x + cursor, top, self.height, 0)
+
+
 class DisplayManager:
-    def __init__(self, i2c:I2C):
+    """
+    Screen layout of a header bar, two primary lines and a footer, kept as retained
+    widgets. Setting a widget to the text it already shows costs a string comparison,
+    and `update` skips the flush entirely when no widget changed.
+
+    With chunk_bytes set, a flush is sent in pieces of at most that many bytes, one
+    piece per `update` or from a background timer, so no single I2C transfer blocks the
+    loop for long. The frame is snapshotted when its flush starts and only the snapshot
+    is sent, so drawing the next frame meanwhile cannot mix into the one being sent.
+    The panel has no vsync though: until the last piece of a flush is sent it shows part
+    of the old and part of the new frame. Small changes fit in one piece, a full frame
+    takes 1024 / chunk_bytes pieces, so use start_background to finish it in a few ticks.
+    """
+    def __init__(self, i2c:I2C, precision: int = 1, chunk_bytes: int = 0):
+        """
+        - i2c: Bus of the SSD1306.
+        - precision: Decimal places shown for numbers passed to the draw methods.
+        - chunk_bytes: Largest piece of display data sent per update, 0 to flush in one go.
+        """
         if not isinstance(i2c, I2C):
             raise TypeError("pin must be a machine.I2C instance")
         self.display = ssd1306.SSD1306_I2C(128, 64, i2c)
         self.display.poweron()
         self.display.contrast(255)
+        d = self.display
+        self.header = TextWidget(d, 0, 0, d.width, _HEADER_HEIGHT, inverted=True, precision=precision)
+        self.top = TextWidget(d, 0, _HEADER_HEIGHT + _PADDING, d.width, 8, precision=precision)
+        self.bottom = TextWidget(d, 0, d.height - _FOOTER_HEIGHT - _PADDING - 8, d.width, 8, precision=precision)
+        self.footer = TextWidget(d, 0, d.height - _FOOTER_HEIGHT, d.width, _FOOTER_HEIGHT, precision=precision)
+        self.widgets = (self.header, self.top, self.bottom, self.footer)
+        # Replaces the two primary lines when used
+        self.keyboard = KeyboardWidget(d, 0, _HEADER_HEIGHT + _PADDING)
+        # Five flex sensors and one IMU angle below the header, one 8-pixel page each
+        self.graph = GraphWidget(d, 0, _HEADER_HEIGHT, d.width, (d.height - _HEADER_HEIGHT) // 8)
+        self.page = PAGE_PLAY
+        self._changed = True
+        self.chunk_bytes = chunk_bytes
+        self._timer = None
+        self.flushes = 0
+        self.flushes_skipped = 0
+        self.max_block_us = 0  # Longest single blocking display write
         self.clear()
 
+    def show_page(self, page: int):
+        """Switch between PAGE_PLAY and PAGE_GRAPH. The draw methods of the other page are ignored."""
+        if page != self.page:
+            self.page = page
+            self.graph.clear()
+            self.clear()
+
+    def set_precision(self, precision: int):
+        """Set the decimal places shown for numbers."""
+        for widget in self.widgets:
+            widget.set_precision(precision)
+
     def clear(self):
+        """Blank the screen. Every widget is drawn again the next time it is set."""
         self.display.fill(0)
+        for widget in self.widgets:
+            widget.text = None
+        self.keyboard.invalidate()
+        self._changed = True
 
     def draw_header(self, text):
         """Draws a solid header bar with inverted text."""
-        self.display.fill_rect(0, 0, self.display.width, _HEADER_HEIGHT, 1)
-        self.display.text(text, _PADDING, 0, 0)
+        if self.header.set(text):
+            self._changed = True
 
     def draw_primary(self, top_line, bottom_line):
         """Draws two lines of primary text."""
-        self.display.text(top_line, _PADDING, _HEADER_HEIGHT + _PADDING, 1)
-        self.display.text(bottom_line, _PADDING, self.display.height - _FOOTER_HEIGHT - _PADDING - 8, 1)
+        if self.page != PAGE_PLAY:
+            return
+        if self.top.set(top_line):
+            self._changed = True
+        if self.bottom.set(bottom_line):
+            self._changed = True
+
+    def draw_keyboard(self, notes: list, held: int):
+        """Draws the keyboard view of the fingers' MIDI notes, held is a bit mask by finger."""
+        if self.page != PAGE_PLAY:
+            return
+        if self.keyboard.set(notes, held):
+            self._changed = True
 
     def draw_footer(self, text):
         """Draws small footer text at the very bottom."""
-        y = self.display.height - _FOOTER_HEIGHT
-        self.display.text(text, _PADDING, y, 1)
+        if self.page != PAGE_PLAY:
+            return
+        if self.footer.set(text):
+            self._changed = True
+
+    def draw_graph(self, values):
+        """Adds a sample to the sensor graph, one value per lane."""
+        if self.page != PAGE_GRAPH:
+            return
+        self.graph.add(values)
+        self._changed = True
 
     def update(self):
+        """
+        Flush the display if any widget changed since the last flush. In chunked mode,
+        start a flush of the current frame if none is in progress and, unless a
+        background timer sends it, send its next piece.
+        """
+        display = self.display
+        if self.chunk_bytes and display.flushing:
+            if self._timer is None:
+                self.step()
+            return
+        if not self._changed:
+            self.flushes_skipped += 1
+            return
+        self._changed = False
+        self.flushes += 1
+        if self.chunk_bytes:
+            display.start_show()
+            if self._timer is None:
+                self.step()
+            return
+        t = ticks_us()
+        try:
+            display.show()
+        except BaseException as e:
+            print("Display update error:", e)
+        self._measure(t)
+
+    def step(self) -> bool:
+        """Send the next piece of a chunked flush. Returns False when there is nothing left to send."""
+        t = ticks_us()
         try:
-            self.display.show()
+            more = self.display.show_step(self.chunk_bytes)
         except BaseException as e:
-            print("Display update error:", e)
\ No newline at end of file
+            print("Display update error:", e)
+            self.display.flushing = False
+            more = False
+        self._measure(t)
+        return more
+
+    def _measure(self, start: int):
+        elapsed = ticks_diff(ticks_us(), start)
+        if elapsed > self.max_block_us:
+            self.max_block_us = elapsed
+
+    def start_background(self, period_ms: int = 10, timer_id: int = 1):
+        """
+        Send chunked flushes from a timer, one piece per tick. `update` then only
+        starts flushes, at points where the loop has finished drawing a frame.
+        """
+        if not self.chunk_bytes:
+            self.chunk_bytes = 128
+        self.stop_background()
+        self._timer = Timer(timer_id)
+        self._timer.init(mode=Timer.PERIODIC, period=period_ms, callback=self._tick)
+
+    def stop_background(self):
+        """Stop the background timer, `update` sends the pieces again."""
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, timer):
+        if self.display.flushing:
+            self.step()
+
+    def reset_stats(self):
+        """Reset the flush counters and the longest blocking write."""
+        self.flushes = 0
+        self.flushes_skipped = 0
+        self.max_block_us = 0
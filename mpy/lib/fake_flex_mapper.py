@@ -10,10 +10,15 @@ class FakeFlexSensorMapper:
     switching hand positions (mappings) and reports these switches.
     """
 
-    def __init__(self, sensor_pins: list = [1, 2, 3, 4, 5], thresholds: tuple = (20, 35, 30, 35, 35)):
+    def __init__(self, sensor_pins: list = [1, 2, 3, 4, 5], thresholds: tuple = (20, 35, 30, 35, 35), clock=None):
         """
         Initializes the FakeFlexSensorMapper in a stopped state.
+
+        Args:
+            clock (MidiClock): Optional MIDI clock follower. When given, song event times
+                are measured in its beat time so playback follows the DAW's tempo.
         """
+        self._ticks_ms = clock.ticks_ms if clock else time.ticks_ms
         self.white_notes = [note + str(octave) for octave in range(3, 6) for note in
                             ['C', 'D', 'E', 'F', 'G', 'A', 'B']]
         self.black_notes = [note + str(octave) for octave in range(3, 6) for note in ['C#', 'D#', 'F#', 'G#', 'A#']]
@@ -37,7 +42,7 @@ class FakeFlexSensorMapper:
         self.note_state = 'OFF'
         self.currently_playing_note = None
         self.last_switch_action = 0
-        self.start_time = time.ticks_add(time.ticks_ms(), delay_s * 1000)
+        self.start_time = time.ticks_add(self._ticks_ms(), delay_s * 1000)
         self.next_event_time = self.start_time
 
     def get_key_mappings(self):
@@ -52,7 +57,7 @@ class FakeFlexSensorMapper:
             tuple: (triggered_notes, detriggered_notes, active_notes, switch_indicator)
                    - switch_indicator: -1 (left), 0 (none), 1 (right), 2 (toggled b/w)
         """
-        current_time = time.ticks_ms()
+        current_time = self._ticks_ms()
 
         # Consume the last switch action and reset it for the current cycle
         switch_indicator = self.last_switch_action
@@ -0,0 +1,132 @@
+from lib.light_manager import Animation, PixelBuffer
+
+
+class BakedClip:
+    """Frames of one animation rendered ahead of time, quantised to a fixed frame interval."""
+
+    def __init__(self, frames: bytearray, length: int, frame_count: int, frame_bytes: int, frame_ms: int,
+                 duration_ms: int):
+        self.frames = frames
+        self.length = length
+        self.frame_count = frame_count
+        self.frame_bytes = frame_bytes
+        self.frame_ms = frame_ms
+        self.duration_ms = duration_ms
+        # One view per frame into the shared bytearray, created once so playback does not allocate
+        mv = memoryview(frames)
+        self.views = [mv[i * frame_bytes:(i + 1) * frame_bytes] for i in range(frame_count)]
+
+
+class BakedAnimation(Animation):
+    """Plays a BakedClip by blitting the current frame into the segment."""
+    __slots__ = ("clip",)
+
+    def setup(self, start_index: int, clip: BakedClip):
+        super().setup(start_index, clip.length, clip.duration_ms)
+        self.clip = clip
+
+    def render(self, np, elapsed: int) -> bool:
+        clip = self.clip
+        if elapsed >= clip.duration_ms:
+            frame = clip.frame_count - 1  # The end state, baked at duration_ms
+        else:
+            frame = elapsed // clip.frame_ms if elapsed > 0 else 0
+        np.blit(self.start_index, clip.views[frame])
+        return elapsed < clip.duration_ms
+
+
+class FrameCache:
+    """
+    Bounded LRU cache of baked animation clips.
+
+    An animation whose output only depends on elapsed time is rendered once per
+    (type, length, color, duration) into a bytearray of frames. Later animations with
+    the same key reuse the clip, wherever they are placed on the strip. The least
+    recently used clips are evicted once the cache holds more than max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 8192, frame_ms: int = 20, bpp: int = 3, order=(1, 0, 2, 3)):
+        """
+        Initialize the cache.
+        - max_bytes: Total size of the baked frames kept.
+        - frame_ms: Time between baked frames.
+        - bpp, order: Byte layout of the strip, NeoPixel.bpp and NeoPixel.ORDER.
+        """
+        self.max_bytes = max_bytes
+        self.frame_ms = frame_ms
+        self.bpp = bpp
+        self.order = order
+        self._clips = {}
+        self._lru = []  # Keys from least to most recently used
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, animation: Animation):
+        """
+        Return the baked clip for an animation if there is one, without baking it on a miss,
+        so it can be called from the render timer.
+        """
+        key = animation.bake_key()
+        clip = self._clips.get(key) if key is not None else None
+        if clip is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._lru[-1] != key:
+            self._lru.remove(key)
+            self._lru.append(key)
+        return clip
+
+    def clip_for(self, animation: Animation):
+        """
+        Return the baked clip for an animation, baking it on a miss.
+        Returns None if the animation cannot be baked.
+        """
+        key = animation.bake_key()
+        if key is None:
+            return None
+        clip = self._clips.get(key)
+        if clip is not None:
+            self.hits += 1
+            if self._lru[-1] != key:
+                self._lru.remove(key)
+                self._lru.append(key)
+            return clip
+
+        self.misses += 1
+        clip = self.bake(animation)
+        self._clips[key] = clip
+        self._lru.append(key)
+        self.size += len(clip.frames)
+        while self.size > self.max_bytes and len(self._lru) > 1:
+            old = self._lru.pop(0)
+            self.size -= len(self._clips.pop(old).frames)
+        return clip
+
+    def bake(self, animation: Animation) -> BakedClip:
+        """Render every frame of an animation into a new clip."""
+        length = animation.length
+        frame_bytes = length * self.bpp
+        duration = animation.duration_ms
+        # Round up so the last frame is the end state at duration, not the last whole frame_ms before it
+        frame_count = -(-duration // self.frame_ms) + 1
+        frames = bytearray(frame_count * frame_bytes)
+        canvas = PixelBuffer(length, self.bpp, self.order)
+
+        start_index = animation.start_index
+        animation.start_index = 0
+        animation.invalidate()
+        for i in range(frame_count):
+            elapsed = min(i * self.frame_ms, duration)
+            animation.render(canvas, elapsed)
+            canvas.read_range(0, length, memoryview(frames)[i * frame_bytes:])
+        animation.start_index = start_index
+        animation.invalidate()
+        return BakedClip(frames, length, frame_count, frame_bytes, self.frame_ms, duration)
+
+    def clear(self):
+        """Drop every baked clip."""
+        self._clips = {}
+        self._lru = []
+        self.size = 0
@@ -1,5 +1,38 @@
 import machine
+import math
+import struct
 import time
+from array import array
+from lib.jy901b_parser import PacketParser
+from lib.uart_rx import UartRx
+
+# Packet types
+PACKET_TIME = 0x50
+PACKET_ACCELERATION = 0x51
+PACKET_ANGULAR_VELOCITY = 0x52
+PACKET_ANGLES = 0x53
+PACKET_MAGNETIC_FIELD = 0x54
+PACKET_PORT_STATUS = 0x55
+PACKET_PRESSURE_HEIGHT = 0x56
+PACKET_QUATERNION = 0x59
+
+# Axis indexes into the raw readings
+ROLL = X = 0
+PITCH = Y = 1
+YAW = Z = 2
+
+# Register values of the supported output rates (RRATE, 0x03) and baud rates (BAUD, 0x04)
+OUTPUT_RATES = {0.2: 0x01, 0.5: 0x02, 1: 0x03, 2: 0x04, 5: 0x05, 10: 0x06, 20: 0x07, 50: 0x08, 100: 0x09,
+                200: 0x0B}
+BAUDRATES = {4800: 0x01, 9600: 0x02, 19200: 0x03, 38400: 0x04, 57600: 0x05, 115200: 0x06, 230400: 0x07}
+
+# Raw reading to unit, and the same scale in fixed point as (multiplier, shift)
+_ACCEL_SCALE = 16 * 9.8 / 32768  # m/s²
+_GYRO_SCALE = 2000 / 32768  # °/s
+_ANGLE_SCALE = 180 / 32768  # °
+_ACCEL_FIXED = (4900, 10)  # mm/s²
+_GYRO_FIXED = (6250, 10)  # hundredths of °/s
+_ANGLE_FIXED = (18000, 15)  # hundredths of °
 
 class JY901B:
     """
@@ -7,7 +40,7 @@ class JY901B:
     Provides methods to configure the IMU, read sensor data, and perform calibration.
     """
 
-    def __init__(self, uart=None, uart_id=0, baudrate=9600, tx_pin=0, rx_pin=1):
+    def __init__(self, uart=None, uart_id=0, baudrate=9600, tx_pin=0, rx_pin=1, fixed_point=False):
         """
         Initialize the JY901B IMU with UART settings.
 
@@ -16,18 +49,31 @@ class JY901B:
             baudrate (int): Baud rate (default: 9600)
             tx_pin (int): TX pin number (default: 0)
             rx_pin (int): RX pin number (default: 1)
+            fixed_point (bool): Scaled accessors return integers in hundredths of a degree and mm/s²
+                instead of floats, which are allocated on every call (default: False)
         """
         if uart:
             self.uart = uart
         else:
             self.uart = machine.UART(uart_id, baudrate=baudrate, tx=machine.Pin(tx_pin), rx=machine.Pin(rx_pin))
-        # Initialize internal storage for sensor data
-        self.angles = None
-        self.acceleration = None
-        self.angular_velocity = None
-        self.magnetic_field = None
+        self.baudrate = baudrate
+        self.output_count = 2  # Packet types per sample, the factory default is acceleration and angles
+        # Latest readings as received, overwritten in place by every packet
+        self.raw_acceleration = array('h', (0, 0, 0))
+        self.raw_angular_velocity = array('h', (0, 0, 0))
+        self.raw_angles = array('h', (0, 0, 0))
+        self.raw_magnetic_field = array('h', (0, 0, 0))
+        self.raw_quaternion = array('h', (32767, 0, 0, 0))  # q0 to q3, scaled by 32768
+        self.raw_pressure_height = array('i', (0, 0))  # Pa, cm
+        self.raw_port_status = array('H', (0, 0, 0, 0))  # D0 to D3
         self.time_data = None
+        self.received = 0  # Bit (packet type - 0x50) is set once that packet type has arrived
+        self.packet_us = array('l', [0] * 11)  # ticks_us each packet type last arrived, by type - 0x50
+        self.rx = None
+        self._rx_timer_id = None
+        self.fixed_point = fixed_point
         # Add more data types as needed in the future
+        self.parser = PacketParser()
         self.unlock()  # Unlock IMU for configuration
 
     def send_command(self, cmd):
@@ -65,12 +111,152 @@ class JY901B:
             "quaternion": 9,
             "gps_accuracy": 10,
         }
+        self.output_count = 0
         for t in types:
             if t in type_bits:
                 rsw |= (1 << type_bits[t])
+                self.output_count += 1
         self.unlock()
         self.send_command([0xFF, 0xAA, 0x02, rsw & 0xFF, (rsw >> 8) & 0xFF])
 
+    def set_output_rate(self, hz):
+        """
+        Set how many times per second the IMU sends each enabled packet type.
+
+        Args:
+            hz: One of OUTPUT_RATES, e.g. 100 or 200. The baud rate must carry
+                hz * packet types * 11 bytes per second, see required_baudrate.
+        """
+        if hz not in OUTPUT_RATES:
+            raise ValueError("Unsupported output rate")
+        self.unlock()
+        self.send_command([0xFF, 0xAA, 0x03, OUTPUT_RATES[hz], 0x00])
+
+    def required_baudrate(self, hz):
+        """
+        Lowest supported baud rate that carries the enabled packet types at an output rate.
+
+        Returns:
+            int: Baud rate, or None if even the fastest one is too slow
+        """
+        bits_per_second = hz * self.output_count * 11 * 10  # 10 bits per byte with start and stop bits
+        for baudrate in sorted(BAUDRATES):
+            # Leave a quarter of the line free so packets do not queue up
+            if baudrate * 3 // 4 >= bits_per_second:
+                return baudrate
+        return None
+
+    def count_packets(self, timeout_ms=300):
+        """
+        Read the UART for a while and count the valid packets received.
+
+        Returns:
+            int: Number of packets that passed the checksum
+        """
+        start = self.parser.packets
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            self.update()
+            time.sleep_ms(10)
+        return self.parser.packets - start
+
+    def _reopen(self, baudrate):
+        """Reconfigure the UART to a new baud rate and drop what was received at the old one."""
+        if self.rx:
+            self.rx.stop()
+        self.uart.init(baudrate=baudrate)
+        self.baudrate = baudrate
+        self._restart_stream()
+        if self.rx:
+            self.rx.reset()
+            self.rx.start(self._rx_timer_id)
+
+    def _restart_stream(self):
+        """Drop what the UART holds and restart the parser, so its stream positions count from 0 like UartRx."""
+        while self.uart.any():
+            self.uart.read()
+        self.parser.reset()
+
+    def start_irq(self, size=1024, timer_id=None):
+        """
+        Receive from an interrupt into a ring buffer, so packets are not lost while the main
+        loop is busy. update then parses from the ring and packet times are arrival times.
+
+        Args:
+            size (int): Ring size in bytes (default: 1024)
+            timer_id (int): Poll from this timer instead of the UART's RX idle interrupt (default: None)
+        """
+        self.stop_irq()
+        self._restart_stream()
+        self.rx = UartRx(self.uart, size)
+        self._rx_timer_id = timer_id
+        self.rx.start(timer_id)
+
+    def stop_irq(self):
+        """Stop interrupt reception, update reads the UART directly again."""
+        if self.rx:
+            self.rx.stop()
+            self.rx = None
+            self._restart_stream()
+
+    def receive_report(self):
+        """
+        Get the reception statistics.
+
+        Returns:
+            tuple: (packets received, bytes lost to a full ring, packets lost at least, checksum errors)
+        """
+        lost_bytes = self.rx.lost_bytes if self.rx else 0
+        overflows = self.rx.overflows if self.rx else 0
+        return self.parser.packets, lost_bytes, overflows, self.parser.checksum_errors
+
+    def set_baudrate(self, baudrate, timeout_ms=300):
+        """
+        Switch the IMU and the UART to a new baud rate, then check that packets arrive.
+        If none do, the IMU is told to go back and the UART is reopened at the old rate.
+
+        Args:
+            baudrate (int): One of BAUDRATES
+            timeout_ms (int): How long to wait for packets at the new rate
+
+        Returns:
+            bool: True if valid packets arrived at the new rate
+        """
+        if baudrate not in BAUDRATES:
+            raise ValueError("Unsupported baud rate")
+        old = self.baudrate
+        if baudrate == old:
+            return True
+        self.unlock()
+        self.send_command([0xFF, 0xAA, 0x04, BAUDRATES[baudrate], 0x00])
+        time.sleep_ms(20)  # Let the command leave the UART before changing its speed
+        self._reopen(baudrate)
+        if self.count_packets(timeout_ms):
+            return True
+        # The IMU may have switched without us hearing it, ask it at the new rate to go back
+        self.unlock()
+        self.send_command([0xFF, 0xAA, 0x04, BAUDRATES[old], 0x00])
+        time.sleep_ms(20)
+        self._reopen(old)
+        return False
+
+    def detect_baudrate(self, timeout_ms=300):
+        """
+        Find the baud rate the IMU is sending at, e.g. after a rate was saved with save_settings,
+        and reopen the UART at it. The current rate is tried first.
+
+        Returns:
+            int: The detected baud rate, or None if no packets were received at any rate
+        """
+        original = self.baudrate
+        for baudrate in [original] + [b for b in BAUDRATES if b != original]:
+            if baudrate != self.baudrate:
+                self._reopen(baudrate)
+            if self.count_packets(timeout_ms):
+                return baudrate
+        self._reopen(original)
+        return None
+
     def save_settings(self):
         """Save the current IMU settings to persist after power-off."""
         self.send_command([0xFF, 0xAA, 0x00, 0x00, 0x00])
@@ -89,66 +275,158 @@ class JY901B:
         Returns:
             tuple: (packet_type, packet_data) or (None, None) if invalid/no data
         """
-        if self.uart.any() >= 11:
-            data = self.uart.read(11)
-            if data and len(data) == 11 and data[0] == 0x55:
-                packet_type = data[1]
-                packet_data = data[2:10]
-                checksum = data[10]
-                calculated_checksum = sum(data[0:10]) & 0xFF
-                if checksum == calculated_checksum:
-                    return packet_type, packet_data
-        return None, None
+        parser = self.parser
+        packet_type = parser.next()
+        if packet_type < 0:
+            parser.fill(self.rx or self.uart)
+            packet_type = parser.next()
+        if packet_type < 0:
+            return None, None
+        return packet_type, bytes(parser.buf[parser.offset:parser.offset + 8])
 
     def update(self):
         """
         Process all available data packets from the UART buffer and update internal state.
         Call this method periodically to refresh sensor data.
         """
-        while self.uart.any() >= 11:
-            packet_type, packet_data = self.read_packet()
-            if packet_type == 0x50:
-                self.time_data = self.parse_time(packet_data)
-            elif packet_type == 0x51:
-                self.acceleration = self.parse_acceleration(packet_data)
-            elif packet_type == 0x52:
-                self.angular_velocity = self.parse_angular_velocity(packet_data)
-            elif packet_type == 0x53:
-                self.angles = self.parse_angles(packet_data)
-            elif packet_type == 0x54:
-                self.magnetic_field = self.parse_magnetic_field(packet_data)
-            # Add more packet types as needed
+        parser = self.parser
+        buf = parser.buf
+        rx = self.rx
+        source = rx or self.uart
+        now = time.ticks_us()
+        while True:
+            packet_type = parser.next()
+            while packet_type >= 0:
+                offset = parser.offset
+                self.packet_us[packet_type - PACKET_TIME] = rx.stamp(parser.position) if rx else now
+                if packet_type == PACKET_ANGLES:
+                    self._store(self.raw_angles, buf, offset)
+                elif packet_type == PACKET_ACCELERATION:
+                    self._store(self.raw_acceleration, buf, offset)
+                elif packet_type == PACKET_ANGULAR_VELOCITY:
+                    self._store(self.raw_angular_velocity, buf, offset)
+                elif packet_type == PACKET_QUATERNION:
+                    self._store(self.raw_quaternion, buf, offset, 4)
+                elif packet_type == PACKET_MAGNETIC_FIELD:
+                    self._store(self.raw_magnetic_field, buf, offset)
+                elif packet_type == PACKET_PRESSURE_HEIGHT:
+                    raw = self.raw_pressure_height
+                    for i in range(2):
+                        value = (buf[offset] | (buf[offset + 1] << 8) | (buf[offset + 2] << 16)
+                                 | (buf[offset + 3] << 24))
+                        raw[i] = value - 0x100000000 if value & 0x80000000 else value
+                        offset += 4
+                elif packet_type == PACKET_PORT_STATUS:
+                    raw = self.raw_port_status
+                    for i in range(4):
+                        raw[i] = buf[offset + 2 * i] | (buf[offset + 2 * i + 1] << 8)
+                elif packet_type == PACKET_TIME:
+                    self.time_data = self.parse_time(buf, offset)
+                # Add more packet types as needed
+                self.received |= 1 << (packet_type - PACKET_TIME)
+                packet_type = parser.next()
+            if not parser.fill(source):
+                break
 
-    def _to_signed_short(self, low, high):
-        """
-        Convert two bytes to a signed 16-bit integer.
+    @staticmethod
+    def _store(raw, data, offset, count=3):
+        """Copy little-endian signed 16-bit values into a raw array without allocating."""
+        for i in range(count):
+            value = data[offset] | (data[offset + 1] << 8)
+            raw[i] = value - 0x10000 if value & 0x8000 else value
+            offset += 2
 
-        Args:
-            low (int): Low byte
-            high (int): High byte
+    def packet_time(self, packet_type):
+        """ticks_us when the latest packet of a type arrived, or was read from the UART without start_irq."""
+        return self.packet_us[packet_type - PACKET_TIME]
 
-        Returns:
-            int: Signed 16-bit value
+    def has(self, packet_type):
+        """Whether a packet of this type has been received, e.g. has(PACKET_ANGLES)."""
+        return bool(self.received >> (packet_type - PACKET_TIME) & 1)
+
+    def _scaled(self, raw, axis, scale, fixed):
+        if self.fixed_point:
+            return raw[axis] * fixed[0] >> fixed[1]
+        return raw[axis] * scale
+
+    def angle(self, axis):
+        """Latest angle of an axis (ROLL, PITCH, YAW) in degrees, or hundredths of a degree in fixed point."""
+        return self._scaled(self.raw_angles, axis, _ANGLE_SCALE, _ANGLE_FIXED)
+
+    def accel(self, axis):
+        """Latest acceleration along an axis (X, Y, Z) in m/s², or mm/s² in fixed point."""
+        return self._scaled(self.raw_acceleration, axis, _ACCEL_SCALE, _ACCEL_FIXED)
+
+    def gyro(self, axis):
+        """Latest angular velocity around an axis (X, Y, Z) in °/s, or hundredths of °/s in fixed point."""
+        return self._scaled(self.raw_angular_velocity, axis, _GYRO_SCALE, _GYRO_FIXED)
+
+    def quaternion(self, index):
+        """Latest quaternion component q0 (w) to q3 (z), from -1 to 1."""
+        return self.raw_quaternion[index] / 32768
+
+    def quaternion_angle(self, axis):
+        """
+        Angle of an axis (ROLL, PITCH, YAW) computed from the quaternion, in degrees,
+        or hundredths of a degree in fixed point. These are the same Euler angles as the
+        angle packets, so roll and yaw are just as ill-defined near ±90° pitch; use up()
+        for a tilt that has no such singularity.
+        """
+        raw = self.raw_quaternion
+        w = raw[0] / 32768
+        x = raw[1] / 32768
+        y = raw[2] / 32768
+        z = raw[3] / 32768
+        if axis == ROLL:
+            angle = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+        elif axis == PITCH:
+            sine = 2 * (w * y - z * x)
+            angle = math.asin(1 if sine > 1 else -1 if sine < -1 else sine)
+        else:
+            angle = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+        angle *= 180 / math.pi
+        return int(angle * 100) if self.fixed_point else angle
+
+    def up(self, axis):
+        """
+        How far a body axis (X, Y, Z) points up, from the quaternion: the vertical component
+        of the rotated axis, from -32768 (straight down) to 32768 (straight up). It is the sine
+        of the axis' elevation, e.g. -up(X) is the sine of the pitch, but it needs no
+        trigonometry or floats and changes smoothly through every orientation.
         """
-        value = (high << 8) | low
-        if value & 0x8000:
-            value -= 65536
-        return value
+        raw = self.raw_quaternion
+        w = raw[0]
+        x = raw[1]
+        y = raw[2]
+        z = raw[3]
+        # Bottom row of the rotation matrix, 2 * a * b in Q15 is a * b >> 14
+        if axis == X:
+            return ((x * z) >> 14) - ((w * y) >> 14)
+        if axis == Y:
+            return ((y * z) >> 14) + ((w * x) >> 14)
+        return 32768 - ((x * x) >> 14) - ((y * y) >> 14)
+
+    def pressure(self):
+        """Latest air pressure in Pa."""
+        return self.raw_pressure_height[0]
+
+    def height(self):
+        """Latest barometric height in m, or cm in fixed point."""
+        height = self.raw_pressure_height[1]
+        return height if self.fixed_point else height / 100
 
-    def parse_time(self, data):
+    def port(self, index):
+        """Latest raw value of port D0 to D3."""
+        return self.raw_port_status[index]
+
+    def parse_time(self, data, offset=0):
         """
         Parse time data packet.
 
         Returns:
             dict: Time components
         """
-        year = data[0]
-        month = data[1]
-        day = data[2]
-        hour = data[3]
-        minute = data[4]
-        second = data[5]
-        millisecond = (data[6] | (data[7] << 8))
+        year, month, day, hour, minute, second, millisecond = struct.unpack_from("<BBBBBBH", data, offset)
         return {
             "year": year,
             "month": month,
@@ -159,71 +437,106 @@ class JY901B:
             "millisecond": millisecond
         }
 
-    def parse_acceleration(self, data):
+    def parse_acceleration(self, data, offset=0):
         """
         Parse acceleration data packet.
 
         Returns:
             dict: Acceleration in m/s² (ax, ay, az)
         """
-        ax = self._to_signed_short(data[0], data[1]) / 32768.0 * 16 * 9.8
-        ay = self._to_signed_short(data[2], data[3]) / 32768.0 * 16 * 9.8
-        az = self._to_signed_short(data[4], data[5]) / 32768.0 * 16 * 9.8
+        ax, ay, az = struct.unpack_from("<hhh", data, offset)
+        ax = ax / 32768.0 * 16 * 9.8
+        ay = ay / 32768.0 * 16 * 9.8
+        az = az / 32768.0 * 16 * 9.8
         return {"ax": ax, "ay": ay, "az": az}
 
-    def parse_angular_velocity(self, data):
+    def parse_angular_velocity(self, data, offset=0):
         """
         Parse angular velocity data packet.
 
         Returns:
             dict: Angular velocity in °/s (gx, gy, gz)
         """
-        gx = self._to_signed_short(data[0], data[1]) / 32768.0 * 2000
-        gy = self._to_signed_short(data[2], data[3]) / 32768.0 * 2000
-        gz = self._to_signed_short(data[4], data[5]) / 32768.0 * 2000
+        gx, gy, gz = struct.unpack_from("<hhh", data, offset)
+        gx = gx / 32768.0 * 2000
+        gy = gy / 32768.0 * 2000
+        gz = gz / 32768.0 * 2000
         return {"gx": gx, "gy": gy, "gz": gz}
 
-    def parse_angles(self, data):
+    def parse_angles(self, data, offset=0):
         """
         Parse angle data packet.
 
         Returns:
             dict: Angles in degrees (roll, pitch, yaw)
         """
-        roll = self._to_signed_short(data[0], data[1]) / 32768.0 * 180.0
-        pitch = self._to_signed_short(data[2], data[3]) / 32768.0 * 180.0
-        yaw = self._to_signed_short(data[4], data[5]) / 32768.0 * 180.0
+        roll, pitch, yaw = struct.unpack_from("<hhh", data, offset)
+        roll = roll / 32768.0 * 180.0
+        pitch = pitch / 32768.0 * 180.0
+        yaw = yaw / 32768.0 * 180.0
         return {"roll": roll, "pitch": pitch, "yaw": yaw}
 
-    def parse_magnetic_field(self, data):
+    def parse_magnetic_field(self, data, offset=0):
         """
         Parse magnetic field data packet.
 
         Returns:
             dict: Magnetic field in raw units (hx, hy, hz)
         """
-        hx = self._to_signed_short(data[0], data[1])
-        hy = self._to_signed_short(data[2], data[3])
-        hz = self._to_signed_short(data[4], data[5])
+        hx, hy, hz = struct.unpack_from("<hhh", data, offset)
         return {"hx": hx, "hy": hy, "hz": hz}
 
-    # Getter methods for accessing the latest sensor data
+    # Getter methods for accessing the latest sensor data as dicts, None until received.
+    # They allocate a new dict per call, the raw arrays and the scaled accessors do not.
     def get_time(self):
         """Get the latest time data."""
         return self.time_data
 
     def get_acceleration(self):
         """Get the latest acceleration data."""
-        return self.acceleration
+        if not self.has(PACKET_ACCELERATION):
+            return None
+        raw = self.raw_acceleration
+        return {"ax": raw[0] * _ACCEL_SCALE, "ay": raw[1] * _ACCEL_SCALE, "az": raw[2] * _ACCEL_SCALE}
 
     def get_angular_velocity(self):
         """Get the latest angular velocity data."""
-        return self.angular_velocity
+        if not self.has(PACKET_ANGULAR_VELOCITY):
+            return None
+        raw = self.raw_angular_velocity
+        return {"gx": raw[0] * _GYRO_SCALE, "gy": raw[1] * _GYRO_SCALE, "gz": raw[2] * _GYRO_SCALE}
 
     def get_angles(self):
         """Get the latest angle data."""
-        return self.angles
+        if not self.has(PACKET_ANGLES):
+            return None
+        raw = self.raw_angles
+        return {"roll": raw[0] * _ANGLE_SCALE, "pitch": raw[1] * _ANGLE_SCALE, "yaw": raw[2] * _ANGLE_SCALE}
 
     def get_magnetic_field(self):
         """Get the latest magnetic field data."""
-        return self.magnetic_field
\ No newline at end of file
+        if not self.has(PACKET_MAGNETIC_FIELD):
+            return None
+        raw = self.raw_magnetic_field
+        return {"hx": raw[0], "hy": raw[1], "hz": raw[2]}
+
+    def get_quaternion(self):
+        """Get the latest quaternion data."""
+        if not self.has(PACKET_QUATERNION):
+            return None
+        raw = self.raw_quaternion
+        return {"q0": raw[0] / 32768, "q1": raw[1] / 32768, "q2": raw[2] / 32768, "q3": raw[3] / 32768}
+
+    def get_pressure_height(self):
+        """Get the latest pressure (Pa) and height (m) data."""
+        if not self.has(PACKET_PRESSURE_HEIGHT):
+            return None
+        raw = self.raw_pressure_height
+        return {"pressure": raw[0], "height": raw[1] / 100}
+
+    def get_port_status(self):
+        """Get the latest port status data."""
+        if not self.has(PACKET_PORT_STATUS):
+            return None
+        raw = self.raw_port_status
+        return {"d0": raw[0], "d1": raw[1], "d2": raw[2], "d3": raw[3]}
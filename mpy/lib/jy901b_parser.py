@@ -0,0 +1,110 @@
+# Plain Python so the parser also runs on the host, see imu_parser_bench.py
+PACKET_SIZE = 11  # 0x55, type, 8 payload bytes, checksum
+_SYNC = 0x55
+_TYPE_FIRST = 0x50
+_TYPE_LAST = 0x5A
+_POSITION_MASK = 0x3FFFFFFF
+
+
+class PacketParser:
+    """
+    Splits a JY901B UART byte stream into packets without allocating.
+
+    Bytes are read with readinto into a preallocated buffer. Packets are found by
+    their 0x55 sync byte, a known type byte and the checksum, all checked in place.
+    A packet that fails the checks only skips its sync byte, so the parser finds
+    the next real packet after noise or a dropped byte instead of staying misaligned.
+
+    After next() returns a packet type, its 8 payload bytes are buf[offset:offset + 8],
+    ready for struct.unpack_from, and position is where the packet ends in the stream,
+    counted in bytes since the last reset and wrapping at 2**30.
+    """
+
+    def __init__(self, size: int = 256):
+        """
+        Initialize the parser.
+        - size: Buffer size in bytes, at least a few packets. Larger reads fewer times per update.
+        """
+        if size < 2 * PACKET_SIZE:
+            raise ValueError("Buffer too small")
+        self.buf = bytearray(size)
+        self._mv = memoryview(self.buf)
+        # After a drain less than a packet is left, so reads only ever start at these offsets
+        self._tails = [self._mv[i:] for i in range(PACKET_SIZE)]
+        self._start = 0
+        self._end = 0
+        self._base = 0  # Stream position of buf[0]
+        self.offset = 0
+        self.position = 0
+        self.packets = 0
+        self.checksum_errors = 0
+        self.skipped = 0  # Bytes discarded while looking for a packet
+
+    def _compact(self) -> int:
+        """Move the unparsed bytes to the front of the buffer, returns their count."""
+        n = self._end - self._start
+        if self._start:
+            buf = self.buf
+            start = self._start
+            self._base = (self._base + start) & _POSITION_MASK
+            for i in range(n):
+                buf[i] = buf[start + i]
+            self._start = 0
+            self._end = n
+        return n
+
+    def fill(self, uart) -> int:
+        """Read what the UART has into the buffer, returns the number of bytes read."""
+        if not uart.any():
+            return 0
+        n = self._compact()
+        read = uart.readinto(self._tails[n] if n < PACKET_SIZE else self._mv[n:])
+        if not read:
+            return 0
+        self._end += read
+        return read
+
+    def feed(self, data) -> int:
+        """Copy bytes into the buffer, for recorded streams. Returns how many fit."""
+        n = self._compact()
+        count = min(len(data), len(self.buf) - n)
+        self.buf[n:n + count] = data[:count]
+        self._end += count
+        return count
+
+    def next(self) -> int:
+        """Find the next valid packet. Returns its type, or -1 when no complete packet is buffered."""
+        buf = self.buf
+        i = self._start
+        end = self._end
+        while end - i >= PACKET_SIZE:
+            if buf[i] != _SYNC:
+                i += 1
+                self.skipped += 1
+                continue
+            kind = buf[i + 1]
+            if _TYPE_FIRST <= kind <= _TYPE_LAST:
+                checksum = 0
+                for j in range(i, i + PACKET_SIZE - 1):
+                    checksum += buf[j]
+                if checksum & 0xFF == buf[i + PACKET_SIZE - 1]:
+                    self.offset = i + 2
+                    self._start = i + PACKET_SIZE
+                    self.position = (self._base + self._start) & _POSITION_MASK
+                    self.packets += 1
+                    return kind
+                self.checksum_errors += 1
+            # Not a packet, resynchronise on the next sync byte
+            i += 1
+            self.skipped += 1
+        self._start = i
+        return -1
+
+    def reset(self):
+        """Drop the buffered bytes and the counters."""
+        self._start = 0
+        self._end = 0
+        self._base = 0
+        self.packets = 0
+        self.checksum_errors = 0
+        self.skipped = 0
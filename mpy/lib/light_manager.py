@@ -1,41 +1,329 @@
 from neopixel import NeoPixel
-from machine import Pin
+from machine import Pin, Timer
 import time
 
 
 
 def lerp_color(c1, c2, t):
-    """Linear interpolate between two colors c1 and c2 by t (0..1)."""
-    return tuple(int(c1[i] + (c2[i] - c1[i]) * t) for i in range(3))
+    """Linear interpolate between two colors c1 and c2 by t (0..1), in 8.8 fixed point."""
+    t8 = int(t * 256)
+    return (c1[0] + (((c2[0] - c1[0]) * t8) >> 8),
+            c1[1] + (((c2[1] - c1[1]) * t8) >> 8),
+            c1[2] + (((c2[2] - c1[2]) * t8) >> 8))
+
+
+def lerp_into(buf, offset: int, start, target, t8: int):
+    """
+    Blend two byte buffers into buf[offset:] in 8.8 fixed point, without allocating.
+
+    Args:
+        buf (bytearray): Destination, usually the NeoPixel buffer.
+        offset (int): Byte offset in buf to start writing at.
+        start (bytearray): Colors at t8 = 0, in buffer byte order.
+        target (bytearray): Colors at t8 = 256, same length as start.
+        t8 (int): Blend position, 0..256.
+    """
+    for j in range(len(start)):
+        a = start[j]
+        buf[offset + j] = a + (((target[j] - a) * t8) >> 8)
+
+
+def build_lut(gamma: float = 1.0, brightness: int = 255):
+    """
+    Build a 256-entry lookup table combining gamma correction and brightness scaling.
+
+    Returns:
+        bytearray: The table, or None if it would be the identity.
+    """
+    if gamma == 1.0 and brightness >= 255:
+        return None
+    lut = bytearray(256)
+    for i in range(256):
+        lut[i] = int(((i / 255) ** gamma) * brightness + 0.5)
+    return lut
+
+
+_lut = None
+
+
+def set_color_correction(gamma: float = 1.0, brightness: int = 255):
+    """Build the gamma/brightness table applied to every color packed for the strip."""
+    global _lut
+    _lut = build_lut(gamma, brightness)
+
+
+def pack_color(color, order=(1, 0, 2, 3), bpp: int = 3, packed: bytearray = None) -> bytearray:
+    """
+    Convert an (r, g, b) color into the strip's byte order with color correction applied,
+    ready to be copied straight into the NeoPixel buffer.
+
+    Args:
+        color (tuple): (r, g, b) or (r, g, b, w) color.
+        order (tuple): Byte order of the strip, NeoPixel.ORDER.
+        bpp (int): Bytes per pixel, NeoPixel.bpp.
+        packed (bytearray): Optional buffer of bpp bytes to pack into instead of allocating.
+    """
+    if packed is None:
+        packed = bytearray(bpp)
+    for i in range(bpp):
+        c = color[i] if i < len(color) else 0
+        packed[order[i]] = _lut[c] if _lut else c
+    return packed
+
+
+_time_source = time.ticks_ms
+
+
+def set_time_source(source=None):
+    """
+    Set the millisecond clock used by all animations, e.g. MidiClock.ticks_ms to make
+    animation durations follow a MIDI clock. Pass None to go back to time.ticks_ms.
+    """
+    global _time_source
+    _time_source = source or time.ticks_ms
+
+
+def now_ms() -> int:
+    """Get the current time of the animation clock in milliseconds."""
+    return _time_source()
+
+
+# How an animation combines with others on the same segment
+BLEND_REPLACE = 0  # Cancel the segment's running animations and take ownership of it
+BLEND_ADD = 1  # Composite above the owner, adding channel values with saturation
+BLEND_MAX = 2  # Composite above the owner, keeping the brighter channel value
+
+
+def composite_into(dst, src, start: int, end: int, blend: int):
+    """Composite src[start:end] onto dst[start:end] with BLEND_ADD or BLEND_MAX."""
+    if blend == BLEND_ADD:
+        for j in range(start, end):
+            v = dst[j] + src[j]
+            dst[j] = v if v < 255 else 255
+    else:
+        for j in range(start, end):
+            v = src[j]
+            if v > dst[j]:
+                dst[j] = v
+
+
+class PixelBuffer:
+    """
+    Pixel buffer with the same interface as NeoPixel, used to render layers.
+
+    The range methods work on whole runs of pixels in the strip's byte order through
+    memoryview slices, so the byte copying runs in C instead of a Python loop per pixel.
+    Colors passed to them are packed with `pack_color`.
+    """
+    def __init__(self, n: int, bpp: int = 3, order=(1, 0, 2, 3), buf: bytearray = None):
+        """
+        Initialize the buffer.
+        - n: Number of pixels.
+        - bpp, order: Byte layout, NeoPixel.bpp and NeoPixel.ORDER.
+        - buf: Existing buffer of n * bpp bytes to work on, e.g. NeoPixel.buf. Allocated if None.
+        """
+        self.n = n
+        self.bpp = bpp
+        self.ORDER = order
+        self.buf = bytearray(n * bpp) if buf is None else buf
+        self._mv = memoryview(self.buf)
+        self._off = bytearray(bpp)
+        self._scratch = None  # Allocated on the first overlapping copy
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, i, v):
+        offset = i * self.bpp
+        for j in range(self.bpp):
+            self.buf[offset + self.ORDER[j]] = v[j]
+
+    def __getitem__(self, i):
+        offset = i * self.bpp
+        return tuple(self.buf[offset + self.ORDER[j]] for j in range(self.bpp))
+
+    def fill_range(self, start: int, count: int, packed=None):
+        """
+        Set count pixels from start to a packed color, or turn them off if packed is None.
+        The color is written once and then doubled with slice copies.
+        """
+        if count <= 0:
+            return
+        bpp = self.bpp
+        mv = self._mv
+        o = start * bpp
+        total = count * bpp
+        mv[o:o + bpp] = self._off if packed is None else packed
+        done = bpp
+        while done < total:
+            n = done if done < total - done else total - done
+            mv[o + done:o + done + n] = mv[o:o + n]
+            done += n
+
+    def copy_range(self, src: int, dst: int, count: int):
+        """Copy count pixels from index src to index dst. The ranges may overlap."""
+        if count <= 0 or src == dst:
+            return
+        bpp = self.bpp
+        mv = self._mv
+        s = src * bpp
+        d = dst * bpp
+        n = count * bpp
+        if s < d + n and d < s + n:
+            # Overlapping, go through a scratch buffer as slice copies are not memmove-safe
+            if self._scratch is None:
+                self._scratch = bytearray(len(self.buf))
+            tmp = memoryview(self._scratch)
+            tmp[:n] = mv[s:s + n]
+            mv[d:d + n] = tmp[:n]
+        else:
+            mv[d:d + n] = mv[s:s + n]
+
+    def shift_range(self, start: int, count: int, by: int, packed=None):
+        """
+        Shift the pixels in [start, start + count) by `by` positions, towards higher
+        indices if positive. Pixels shifted out are dropped, vacated pixels are set to
+        packed, or turned off if packed is None.
+        """
+        if by == 0 or count <= 0:
+            return
+        if by >= count or -by >= count:
+            self.fill_range(start, count, packed)
+        elif by > 0:
+            self.copy_range(start, start + by, count - by)
+            self.fill_range(start, by, packed)
+        else:
+            self.copy_range(start - by, start, count + by)
+            self.fill_range(start + count + by, -by, packed)
+
+    def blit(self, start: int, data):
+        """Copy prepared pixel bytes, in strip byte order, to the pixels from start."""
+        o = start * self.bpp
+        self._mv[o:o + len(data)] = data
+
+    def read_range(self, start: int, count: int, out):
+        """Copy count pixels from start into out, a bytearray of at least count * bpp bytes."""
+        o = start * self.bpp
+        n = count * self.bpp
+        out[:n] = self._mv[o:o + n]
 
 
 class Animation:
-    """Base class for LED animations."""
-    def __init__(self, start_index: int, length: int, duration_ms: int):
+    """
+    Base class for LED animations.
+
+    Subclasses set themselves up in `setup` rather than `__init__`, so that pooled
+    animations can be reset and reused without allocating a new object.
+    """
+    __slots__ = ("start_index", "length", "duration_ms", "start_time", "pool", "segment", "blend", "z",
+                 "pixel_writes")
+    spans_segments = False  # True for players that draw across segments and never own one
+
+    def __init__(self, *args, **kwargs):
+        self.pool = None  # AnimationPool this animation is returned to when finished
+        self.segment = -1  # Set by LightManager.add_animation
+        self.blend = BLEND_REPLACE
+        self.z = 0
+        self.init_state()
+        if args or kwargs:
+            self.setup(*args, **kwargs)
+
+    def init_state(self) -> None:
+        """Initialize per-object buffers once. Called before the first setup."""
+        pass
+
+    def setup(self, start_index: int, length: int, duration_ms: int) -> None:
+        """(Re)initialize the animation and restart it."""
         self.start_index = start_index
         self.length = length
         self.duration_ms = duration_ms
-        self.start_time = time.ticks_ms()
+        self.start_time = now_ms()
+        self.pixel_writes = 0  # Pixels written so far, for measuring rendering cost
+        self.invalidate()
 
-    def update(self, np: NeoPixel) -> bool:
+    def invalidate(self) -> None:
+        """
+        Forget what was drawn, so the next frame is drawn in full. Animations that only
+        redraw changed pixels need this when their pixels may have been overwritten.
+        """
+        pass
+
+    def update(self, np: PixelBuffer) -> bool:
         """Update LEDs for this frame. Return False if finished."""
+        return self.render(np, time.ticks_diff(now_ms(), self.start_time))
+
+    def render(self, np: PixelBuffer, elapsed: int) -> bool:
+        """Draw the frame at elapsed ms into np. Return False if finished."""
         raise NotImplementedError
 
+    def bake_key(self):
+        """
+        Return a key identifying this animation's output independently of its position,
+        or None if the output also depends on the strip contents and cannot be baked.
+        """
+        return None
+
     def reset(self) -> None:
         """Reset Animation start time."""
-        self.start_time = time.ticks_ms()
+        self.start_time = now_ms()
+        self.invalidate()
+
+
+class AnimationPool:
+    """
+    Fixed-capacity pool of reusable animations of one class.
+
+    Free animations are kept in a preallocated ring, so acquiring and releasing
+    never allocates. Acquired animations are set up by calling their `setup` method,
+    and are returned to the pool by LightManager when they finish or are cancelled.
+    """
+    def __init__(self, cls, capacity: int):
+        """
+        Initialize the pool.
+        - cls: Animation subclass to preallocate.
+        - capacity: Number of animations created up front.
+        """
+        self._size = capacity + 1
+        self._free = [None] * self._size
+        for i in range(capacity):
+            anim = cls()
+            anim.pool = self
+            self._free[i] = anim
+        self._head = 0  # Next animation to hand out
+        self._tail = capacity  # Next slot for a released animation
+        self.misses = 0  # Number of acquire calls with the pool exhausted
+
+    def available(self) -> int:
+        """Return the number of free animations."""
+        return (self._tail - self._head) % self._size
+
+    def acquire(self):
+        """Take a free animation, or None if the pool is exhausted. Call its setup before use."""
+        if self._head == self._tail:
+            self.misses += 1
+            return None
+        anim = self._free[self._head]
+        self._free[self._head] = None
+        self._head = (self._head + 1) % self._size
+        return anim
+
+    def release(self, anim: Animation) -> None:
+        """Return an animation to the pool."""
+        self._free[self._tail] = anim
+        self._tail = (self._tail + 1) % self._size
+
 
 class ScheduledAnimation:
     """Wraps an animation with a start delay."""
     def __init__(self, animation: Animation, delay_ms: int):
         self.animation = animation
         self.delay_ms = delay_ms
-        self.start_time = time.ticks_ms()
+        self.start_time = now_ms()
         self.started = False
 
-    def update(self, np: NeoPixel) -> bool:
+    def update(self, np: PixelBuffer) -> bool:
         """Update the animation if its delay has passed."""
-        elapsed = time.ticks_diff(time.ticks_ms(), self.start_time)
+        elapsed = time.ticks_diff(now_ms(), self.start_time)
         if elapsed < self.delay_ms:
             return True  # Keep waiting
 
@@ -45,13 +333,28 @@ class ScheduledAnimation:
 
         return self.animation.update(np)  # Run the animation
 
+    def invalidate(self) -> None:
+        """Make the wrapped animation draw in full on its next frame."""
+        self.animation.invalidate()
+
     def reset(self) -> None:
         """Reset Scheduled animation."""
-        self.start_time = time.ticks_ms()
+        self.start_time = now_ms()
         self.started = False
 
 class Sequence:
-    """Represents a sequence of animations with delays and replay settings."""
+    """
+    Represents a sequence of animations with delays and replay settings.
+
+    Animations are kept in start-time order with a cursor pointing at the next one
+    to start, so each frame only touches animations that are due or running.
+    Replaying rewinds the cursor instead of rebuilding anything.
+    """
+    pool = None  # Sequences are never pooled
+    spans_segments = True
+    segment = -1  # Sequences span several segments and never own one
+    blend = BLEND_REPLACE
+    z = 0
     def __init__(self, animations: list, delays_ms: list, replay_count: int = 1):
         """
         Initialize a sequence.
@@ -65,32 +368,59 @@ class Sequence:
         self.delays_ms = delays_ms
         self.replay_count = replay_count  # 0 for infinite, >0 for finite replays
         self.current_replay = 0
-        self.scheduled_animations = []
+        # Indices of the animations sorted by start delay, built once
+        self._order = sorted(range(len(animations)), key=lambda i: delays_ms[i])
+        self._cursor = 0  # Position in _order of the next animation to start
+        self._running = [None] * len(animations)
+        self._running_count = 0
         self.start_time = None
         self.reset()
 
     def reset(self):
         """Reset the sequence to start from the beginning."""
-         # Reset each animation's internal state
-        for anim in self.animations:
-            anim.reset()
-        # Recreate scheduled animations to reset delay timers
-        self.scheduled_animations = [
-            ScheduledAnimation(anim, delay) for anim, delay in zip(self.animations, self.delays_ms)
-        ]
-        self.start_time = time.ticks_ms()
+        for i in range(self._running_count):
+            self._running[i] = None
+        self._running_count = 0
+        self._cursor = 0
+        self.start_time = now_ms()
         self.current_replay += 1
 
-    def update(self, np: NeoPixel) -> bool:
+    def invalidate(self):
+        """Make the running animations draw in full on their next frame."""
+        for i in range(self._running_count):
+            self._running[i].invalidate()
+
+    def update(self, np: PixelBuffer) -> bool:
         """Update all animations in the sequence. Return False if sequence is finished."""
-        still_running = []
-        for sched_anim in self.scheduled_animations:
-            if sched_anim.update(np):
-                still_running.append(sched_anim)
+        elapsed = time.ticks_diff(now_ms(), self.start_time)
+        running = self._running
+        count = self._running_count
+
+        # Start every animation whose delay has passed
+        order = self._order
+        cursor = self._cursor
+        while cursor < len(order):
+            index = order[cursor]
+            if self.delays_ms[index] > elapsed:
+                break
+            anim = self.animations[index]
+            anim.reset()  # Reset time when delay ends
+            running[count] = anim
+            count += 1
+            cursor += 1
+        self._cursor = cursor
 
-        self.scheduled_animations = still_running
+        kept = 0
+        for i in range(count):
+            anim = running[i]
+            if anim.update(np):
+                running[kept] = anim
+                kept += 1
+        for i in range(kept, count):
+            running[i] = None
+        self._running_count = kept
 
-        if not still_running:
+        if not kept and cursor >= len(order):
             # Sequence iteration finished
             if self.replay_count == 0 or self.current_replay < self.replay_count:
                 self.reset()
@@ -98,40 +428,481 @@ class Sequence:
             return False  # Sequence fully done
         return True
 
-class LightManager:
-    """Controls multiple animations across LED segments."""
-    def __init__(self, pin: Pin, total_count: int, segment_count: int) -> None:
-        if not isinstance(pin, Pin):
-            raise TypeError("pin must be a machine.Pin instance")
 
-        self.np = NeoPixel(pin, total_count)
-        self.total_count = total_count
+class LightManager(PixelBuffer):
+    """
+    Controls multiple animations across LED segments.
+
+    The manager is itself a PixelBuffer over one logical frame covering every strip,
+    so animations draw through its range methods straight into the frame that is sent.
+    Each strip's NeoPixel buffer is a view of its slice of that frame, so a frame is
+    sent without copying, and strips whose slice did not change are not written.
+
+    Segments are consecutive runs of LEDs on the logical frame and may have different
+    lengths. Each segment is owned by at most one animation. Adding an animation with
+    BLEND_REPLACE cancels whatever is running on its segment, so a note-off fade
+    replaces the note-on wipe instead of fighting over the same pixels. Animations
+    added with BLEND_ADD or BLEND_MAX are rendered into an off-screen layer and
+    composited above the owner in ascending z order, so the result does not depend
+    on the order the animations were added. The owner output under the layers is kept
+    and put back before the next frame, so layers never build up on the frame and a
+    segment returns to its owner output when its layers finish.
+    """
+    def __init__(self, pin, total_count, segment_count: int, gamma: float = 1.0,
+                 brightness: int = 255, max_animations: int = 16, segment_lengths: list = None,
+                 max_ma: int = 0) -> None:
+        """
+        Initialize the light manager.
+        - pin: Data pin of the strip, or a list of pins to drive several strips.
+        - total_count: Number of LEDs on the strip, or a list with the LED count of each strip.
+          The strips are chained in the order given to form the logical frame.
+        - segment_count: Number of segments the frame is split into.
+        - gamma, brightness: Color correction applied to animation colors through a lookup table built once.
+        - max_animations: Capacity of the preallocated array of running animations.
+        - segment_lengths: Optional LED count of each segment. By default the frame is split
+          as evenly as possible, with the first segments one LED longer if it does not divide.
+        - max_ma: Current budget of the strips in mA, 0 for no limit. See set_power_limit.
+        """
+        pins = pin if isinstance(pin, (list, tuple)) else [pin]
+        counts = total_count if isinstance(total_count, (list, tuple)) else [total_count]
+        if len(pins) != len(counts):
+            raise ValueError("Number of pins must match number of strip lengths")
+        for p in pins:
+            if not isinstance(p, Pin):
+                raise TypeError("pin must be a machine.Pin instance")
+
+        set_color_correction(gamma, brightness)
+
+        self.strips = [NeoPixel(pins[i], counts[i]) for i in range(len(pins))]
+        self.np = self.strips[0]
+        total = sum(counts)
+        super().__init__(total, self.np.bpp, self.np.ORDER)
+        self.total_count = total
+
+        # Copy of the last frame sent, strips whose slice is unchanged are not written
+        self._sent = bytearray(len(self.buf))
+        sent = memoryview(self._sent)
+        # Power-limited copy of the frame, sent instead of it when the frame is scaled down
+        self._out = bytearray(len(self.buf))
+        out = memoryview(self._out)
+        self._strip_views = []
+        self._sent_views = []
+        self._out_views = []
+        o = 0
+        for strip in self.strips:
+            n = strip.n * strip.bpp
+            strip.buf = self._mv[o:o + n]  # Write straight from the shared frame
+            self._strip_views.append(strip.buf)
+            self._sent_views.append(sent[o:o + n])
+            self._out_views.append(out[o:o + n])
+            o += n
+
+        if segment_lengths is None:
+            base, extra = divmod(total, segment_count)
+            segment_lengths = [base + 1 if i < extra else base for i in range(segment_count)]
+        elif len(segment_lengths) != segment_count or sum(segment_lengths) > total:
+            raise ValueError("segment_lengths must have segment_count entries fitting in the frame")
         self.segment_count = segment_count
-        self.segment_length = total_count // segment_count
-        self.animations = []
+        self.segment_lengths = list(segment_lengths)
+        self.segment_starts = [0] * segment_count
+        o = 0
+        for i in range(segment_count):
+            self.segment_starts[i] = o
+            o += segment_lengths[i]
+        self.segment_length = min(segment_lengths)  # Shortest segment, for layouts treating all segments alike
+        # Segment of every LED, LEDs after the last segment belong to it
+        self._segment_map = bytearray(total)
+        for i in range(segment_count):
+            start = self.segment_starts[i]
+            end = start + segment_lengths[i] if i < segment_count - 1 else total
+            for j in range(start, end):
+                self._segment_map[j] = i
+
+        # Running animations, compacted in place so updating allocates nothing
+        self.animations = [None] * max_animations
+        self.animation_count = 0
+        self.dropped_animations = 0
+        self.owners = [None] * segment_count  # Owning animation of each segment
+        self._layer = PixelBuffer(total, self.bpp, self.ORDER)  # Scratch buffer for composited layers
+        # Owner output of the segments layers were composited on, restored before the next frame
+        # so owners, which only redraw changed pixels, keep drawing over their own output
+        self._base = bytearray(len(self.buf))
+        base = memoryview(self._base)
+        self._segment_frame_views = []
+        self._segment_base_views = []
+        for i in range(segment_count):
+            start = self.segment_starts[i] * self.bpp
+            end = (self.segment_starts[i] + segment_lengths[i] if i < segment_count - 1 else total) * self.bpp
+            self._segment_frame_views.append(self._mv[start:end])
+            self._segment_base_views.append(base[start:end])
+        self._composited = bytearray(segment_count)  # Segments holding composited layers
+
+        self._dirty = True
+        self.frames_written = 0
+        self.frames_skipped = 0
+        self.strip_writes = 0
+        self._sent_scale = 256
+        self.requested_ma = 0  # Estimated draw of the last frame written, before limiting
+        self.frame_ma = 0  # Estimated draw of the last frame written, as sent
+        self.frames_limited = 0
+        self.set_power_limit(max_ma)
+
+        # Fixed-rate rendering, see start_render. Animations added meanwhile wait in a
+        # preallocated ring until the next frame, so the timer never sees a half-updated array.
+        self._timer = None
+        self._period_us = 0
+        self._due_us = 0
+        self.budget_us = 0
+        self._render_est_us = 0  # Peak-hold estimate of the render time
+        self._pending = [None] * (max_animations + 1)
+        self._pending_blend = bytearray(max_animations + 1)
+        self._pending_z = [0] * (max_animations + 1)
+        self._pending_head = 0
+        self._pending_tail = 0
+        self.reset_render_stats()
+
+        # Called at the start of every frame, animations it adds start in that frame
+        self.on_frame = None
+        self._in_frame = False
 
     def get_segment_start(self, segment_index: int) -> int:
         """Return the starting LED index of a segment."""
-        return segment_index * self.segment_length
+        return self.segment_starts[segment_index]
+
+    def get_segment_length(self, segment_index: int) -> int:
+        """Return the number of LEDs in a segment."""
+        return self.segment_lengths[segment_index]
+
+    def segment_of(self, index: int) -> int:
+        """Return the segment an LED index belongs to."""
+        return self._segment_map[index]
+
+    def get_owner(self, segment_index: int):
+        """Return the animation owning a segment, or None."""
+        return self.owners[segment_index]
+
+    def add_animation(self, animation: Animation, blend: int = BLEND_REPLACE, z: int = 0) -> bool:
+        """
+        Start running an animation. Returns False, and returns a pooled animation to
+        its pool, if the array of running animations is full.
+        - blend: BLEND_REPLACE cancels the animations running on the segment and takes
+          ownership of it. BLEND_ADD and BLEND_MAX composite above the owner instead.
+        - z: Order of composited animations, higher is drawn later.
+        While rendering on a timer, the animation starts with the next frame.
+        Sequences and timeline players span segments and can only use BLEND_REPLACE.
+        """
+        if blend != BLEND_REPLACE and animation.spans_segments:
+            raise ValueError("Animations spanning segments cannot be layered")
+        if self._timer is not None and not self._in_frame:
+            return self._queue(animation, blend, z)
+        return self._add(animation, blend, z)
+
+    def _queue(self, animation, blend: int, z: int) -> bool:
+        """Hand an animation to the render timer through the pending ring."""
+        size = len(self._pending)
+        tail = self._pending_tail
+        nxt = (tail + 1) % size
+        if nxt == self._pending_head:
+            self.dropped_animations += 1
+            if animation.pool is not None:
+                animation.pool.release(animation)
+            return False
+        self._pending[tail] = animation
+        self._pending_blend[tail] = blend
+        self._pending_z[tail] = z
+        self._pending_tail = nxt  # Publish only once the slot is filled
+        return True
+
+    def _drain_pending(self):
+        """Start the animations queued since the last frame."""
+        size = len(self._pending)
+        head = self._pending_head
+        while head != self._pending_tail:
+            anim = self._pending[head]
+            self._pending[head] = None
+            self._add(anim, self._pending_blend[head], self._pending_z[head])
+            head = (head + 1) % size
+        self._pending_head = head
+
+    def _add(self, animation, blend: int, z: int) -> bool:
+        if animation.spans_segments:
+            segment = -1
+        else:
+            segment = self.segment_of(animation.start_index)
+            if blend == BLEND_REPLACE:
+                self.cancel_segment(segment)
+                self.owners[segment] = animation
+
+        if self.animation_count >= len(self.animations):
+            self.dropped_animations += 1
+            if segment >= 0 and self.owners[segment] is animation:
+                self.owners[segment] = None
+            if animation.pool is not None:
+                animation.pool.release(animation)
+            return False
 
-    def add_animation(self, animation: Animation):
-        self.animations.append(animation)
+        animation.segment = segment
+        animation.blend = blend
+        animation.z = z
+
+        # Keep owners first, then layers in ascending z, ties in the order they were added
+        animations = self.animations
+        layered = blend != BLEND_REPLACE
+        i = self.animation_count
+        while i > 0:
+            prev = animations[i - 1]
+            prev_layered = prev.blend != BLEND_REPLACE
+            if prev_layered < layered or (prev_layered == layered and (not layered or prev.z <= z)):
+                break
+            animations[i] = prev
+            i -= 1
+        animations[i] = animation
+        self.animation_count += 1
+        return True
+
+    def cancel_segment(self, segment_index: int):
+        """Stop every animation running on a segment and return pooled ones to their pool."""
+        animations = self.animations
+        count = self.animation_count
+        kept = 0
+        for i in range(count):
+            anim = animations[i]
+            if anim.segment == segment_index:
+                if anim.pool is not None:
+                    anim.pool.release(anim)
+            else:
+                animations[kept] = anim
+                kept += 1
+        for i in range(kept, count):
+            animations[i] = None
+        self.animation_count = kept
+        self.owners[segment_index] = None
 
     def add_sequence(self, animations: list, delays_ms: list, replay_count: int = 1):
         """Add a sequence of animations with delays and replay count."""
         sequence = Sequence(animations, delays_ms, replay_count)
-        self.animations.append(sequence)
+        self.add_animation(sequence)
 
     def update(self):
-        """Call this in your main loop to refresh LEDs."""
-        still_running = []
-        for anim in self.animations:
-            if anim.update(self.np):
-                still_running.append(anim)
-        self.animations = still_running
-        self.np.write()
+        """
+        Call this in your main loop to refresh LEDs.
+        The strip is only written when the frame differs from the last one sent.
+        """
+        if self.on_frame is not None:
+            self._in_frame = True
+            self.on_frame()
+            self._in_frame = False
+        restored = self._restore_base()
+        count = self.animation_count
+        if count:
+            animations = self.animations
+            kept = 0
+            for i in range(count):
+                anim = animations[i]
+                if anim.blend == BLEND_REPLACE:
+                    running = anim.update(self)
+                else:
+                    running = self._update_layer(anim)
+                if running:
+                    animations[kept] = anim
+                    kept += 1
+                else:
+                    if anim.segment >= 0 and self.owners[anim.segment] is anim:
+                        self.owners[anim.segment] = None
+                    if anim.pool is not None:
+                        anim.pool.release(anim)
+            for i in range(kept, count):
+                animations[i] = None
+            self.animation_count = kept
+        elif not self._dirty and not restored:
+            # Nothing ran and nothing was invalidated, the frame cannot have changed
+            self.frames_skipped += 1
+            return
+
+        if not self._dirty and self.buf == self._sent:
+            self.frames_skipped += 1
+            return
+        self.write()
+
+    def _restore_base(self) -> bool:
+        """Put back the owner output of the segments layers were composited on last frame."""
+        composited = self._composited
+        restored = False
+        for i in range(len(composited)):
+            if composited[i]:
+                self._segment_frame_views[i][:] = self._segment_base_views[i]
+                composited[i] = 0
+                restored = True
+        return restored
+
+    def _update_layer(self, anim) -> bool:
+        """Render a composited animation off-screen and blend it onto the frame."""
+        bpp = self.bpp
+        start = anim.start_index * bpp
+        end = start + anim.length * bpp
+        # Keep the owner output of the covered segments before the first layer changes them
+        composited = self._composited
+        last = self.segment_of(anim.start_index + anim.length - 1)
+        for i in range(self.segment_of(anim.start_index), last + 1):
+            if not composited[i]:
+                self._segment_base_views[i][:] = self._segment_frame_views[i]
+                composited[i] = 1
+        layer = self._layer
+        layer.fill_range(anim.start_index, anim.length)
+        anim.invalidate()  # The layer was cleared, draw the whole frame
+        running = anim.update(layer)
+        composite_into(self.buf, layer.buf, start, end, anim.blend)
+        return running
+
+    def write(self):
+        """Write the strips whose part of the frame changed, like NeoPixel.write, and remember the frame as sent."""
+        strips = self.strips
+        views = self._strip_views
+        sent = self._sent_views
+        scale = self._limit_power()
+        force = self._dirty or scale != self._sent_scale
+        for i in range(len(strips)):
+            if force or views[i] != sent[i]:
+                strips[i].buf = self._out_views[i] if scale < 256 else views[i]
+                strips[i].write()
+                sent[i][:] = views[i]
+                self.strip_writes += 1
+        self._sent_scale = scale
+        self._dirty = False
+        self.frames_written += 1
+
+    def set_power_limit(self, max_ma: int, ma_per_channel: int = 20, idle_ma: int = 1):
+        """
+        Limit the estimated current draw of the strips.
+        - max_ma: Budget in mA, 0 for no limit.
+        - ma_per_channel: Draw of one color channel at full brightness.
+        - idle_ma: Draw of one LED that is off.
+        Frames estimated above the budget are scaled down as a whole, keeping their colors.
+        A budget must leave room above the idle draw of all the LEDs.
+        """
+        if max_ma and max_ma <= idle_ma * self.total_count:
+            raise ValueError("max_ma must be above the idle draw of %d mA" % (idle_ma * self.total_count))
+        self.max_ma = max_ma
+        self.ma_per_channel = ma_per_channel
+        self._idle_ma = idle_ma * self.total_count
+        self.invalidate()
+
+    def _limit_power(self) -> int:
+        """
+        Estimate the frame's current draw and, if it is over budget, scale it into the
+        output buffer. Returns the 8.8 fixed-point scale, 256 when the frame is sent as is.
+        """
+        color_ma = sum(self.buf) * self.ma_per_channel // 255
+        self.requested_ma = self._idle_ma + color_ma
+        self.frame_ma = self.requested_ma
+        if not self.max_ma or self.requested_ma <= self.max_ma or not color_ma:
+            return 256
+        scale = ((self.max_ma - self._idle_ma) << 8) // color_ma
+        if scale < 0:
+            scale = 0
+        buf = self.buf
+        out = self._out
+        for j in range(len(buf)):
+            out[j] = buf[j] * scale >> 8
+        self.frame_ma = self._idle_ma + (color_ma * scale >> 8)
+        self.frames_limited += 1
+        return scale
+
+    def invalidate(self):
+        """Force the next update to write every strip, e.g. after a strip was power-cycled."""
+        self._dirty = True
+
+    def start_render(self, fps: int = 50, timer_id: int = 0, budget_us: int = None):
+        """
+        Render frames from a hardware timer at a fixed rate, independently of the main loop.
+        The callback is a soft interrupt, so it runs between bytecodes of the main loop and
+        the main loop no longer has to call update.
+        - fps: Frame rate.
+        - timer_id: Hardware timer to use.
+        - budget_us: Time a frame may take from its due time, one frame period by default.
+          A frame that would end past its budget, judged from how late the tick is and how
+          long recent frames took, is dropped instead; animations are time-based, so the
+          next frame catches up.
+        """
+        self.stop_render()
+        self._period_us = 1000000 // fps
+        self.budget_us = budget_us or self._period_us
+        self._due_us = time.ticks_add(time.ticks_us(), self._period_us)
+        self.reset_render_stats()
+        self._timer = Timer(timer_id)
+        self._timer.init(mode=Timer.PERIODIC, freq=fps, callback=self._tick)
+
+    def stop_render(self):
+        """Stop the render timer. The main loop calls update again afterwards."""
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+            self._drain_pending()
+
+    def _tick(self, timer):
+        """Timer callback, renders the frame unless it is a duplicate or would overrun."""
+        now = time.ticks_us()
+        period = self._period_us
+        late = time.ticks_diff(now, self._due_us)
+        if late < -(period >> 1):
+            return  # A tick queued behind one that already rendered this slot
+        if late >= period:
+            # The main loop held off the scheduler for whole frames, count them and resync
+            self.frames_dropped += late // period
+            late %= period
+        self._due_us = time.ticks_add(now, period - late)
+        if late + self._render_est_us > self.budget_us:
+            self.frames_dropped += 1
+            return
+        self.render_frame()
+
+    def render_frame(self):
+        """
+        Start queued animations, render and send one frame, and record how long it took.
+        Called by the render timer, or can be awaited in a loop from an asyncio task.
+        """
+        start = time.ticks_us()
+        self._drain_pending()
+        self.update()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        est = self._render_est_us
+        self._render_est_us = elapsed if elapsed > est else est - ((est - elapsed) >> 3)
+        self.frames_rendered += 1
+        self.render_us_total += elapsed
+        if elapsed > self.render_us_max:
+            self.render_us_max = elapsed
+
+    def render_report(self):
+        """
+        Return the render statistics since the last reset:
+        (frames per second, average render time in us, maximum render time in us, frames dropped).
+        """
+        frames = self.frames_rendered
+        span = time.ticks_diff(time.ticks_us(), self._stats_start_us)
+        fps = frames * 1000000 / span if span > 0 else 0
+        avg = self.render_us_total // frames if frames else 0
+        return fps, avg, self.render_us_max, self.frames_dropped
+
+    def reset_render_stats(self):
+        """Reset the render rate and timing statistics."""
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self.render_us_total = 0
+        self.render_us_max = 0
+        self._stats_start_us = time.ticks_us()
+
+    def reset_frame_stats(self):
+        """Reset the written and skipped frame counters."""
+        self.frames_written = 0
+        self.frames_skipped = 0
+        self.strip_writes = 0
+        self.frames_limited = 0
 
     def clear(self):
-        """Turn off all LEDs."""
-        self.np.fill((0,0,0))
-        self.np.write()
\ No newline at end of file
+        """Turn off all LEDs. Running animations redraw in full on the next frame."""
+        for i in range(len(self._composited)):
+            self._composited[i] = 0
+        for i in range(self.animation_count):
+            self.animations[i].invalidate()
+        self.fill_range(0, self.total_count)
+        self.write()
\ No newline at end of file
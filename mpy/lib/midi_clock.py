@@ -0,0 +1,163 @@
+from micropython import const
+from time import ticks_us, ticks_ms, ticks_diff, ticks_add
+
+PPQN = const(24)
+
+_FREQ_SHIFT = const(4)  # Frequency gain of the loop, 1/16
+_PHASE_SHIFT = const(2)  # Phase gain of the loop, 1/4
+_LOCK_TIMEOUT_US = const(500000)  # Free-run after this long without clock
+_MIN_PERIOD_US = const(8333)  # 300 BPM
+_MAX_PERIOD_US = const(125000)  # 20 BPM
+
+
+class MidiClock:
+    """
+    Follows incoming 24 PPQN MIDI clock and provides a smoothed tempo and phase estimate.
+
+    A second-order PLL tracks the expected time of the next clock tick. Each incoming
+    tick corrects the phase by a quarter of the timing error and the tick period by a
+    sixteenth of it, which filters out BLE connection-interval jitter. When the clock
+    stops the estimate free-runs at the last tempo, and before any clock arrives it
+    runs at the reference tempo.
+
+    `ticks_ms` returns a "beat time" in milliseconds at the reference tempo: it advances
+    at wall-clock speed when the incoming tempo equals `ref_bpm`, and faster or slower
+    otherwise. Passing it to `light_manager.set_time_source` or FakeFlexSensorMapper
+    makes durations given with `beats()` follow the DAW's tempo.
+
+    Clock handling uses small integers only, so it does not allocate per clock tick.
+    """
+
+    def __init__(self, ref_bpm: int = 120):
+        """
+        Initializes the MidiClock in a stopped, unlocked state.
+
+        Args:
+            ref_bpm (int): Reference tempo that beat time and `beats()` are expressed in.
+        """
+        self.ref_bpm = ref_bpm
+        self._ref_tick_us = 60000000 // (ref_bpm * PPQN)
+        self._period_q8 = self._ref_tick_us << 8  # Estimated tick period, Q24.8 microseconds
+        self._last_us = ticks_us()  # Smoothed time of the latest tick
+        self._expected_us = ticks_add(self._last_us, self._ref_tick_us)
+        self.locked = False
+        self.running = False
+        self.song_ticks = 0  # Clock ticks since the last Start message
+        self.clocks_received = 0
+
+        # Beat-time counter in ms at the reference tempo, plus sub-ms remainder in us
+        self._ms = ticks_ms()
+        self._rem_us = 0
+
+    def _advance(self):
+        """Move the beat time forward by one tick."""
+        rem = self._rem_us + self._ref_tick_us
+        ms = rem // 1000
+        self._rem_us = rem - ms * 1000
+        self._ms = ticks_add(self._ms, ms)
+        if self.running:
+            self.song_ticks += 1
+
+    def _free_run(self, now: int):
+        """Generate the ticks that were due while no clock arrived."""
+        period = self._period_q8 >> 8
+        while ticks_diff(now, self._expected_us) >= 0:
+            self._advance()
+            self._last_us = self._expected_us
+            self._expected_us = ticks_add(self._expected_us, period)
+
+    def clock(self):
+        """Handle one incoming MIDI clock tick."""
+        now = ticks_us()
+        self.clocks_received += 1
+        if not self.locked:
+            # (Re)acquire: catch up on free-run ticks, then take this tick as the phase reference
+            self._free_run(ticks_add(now, -(self._period_q8 >> 9)))
+            self.locked = True
+            self._advance()
+            self._last_us = now
+            self._expected_us = ticks_add(now, self._period_q8 >> 8)
+            return
+
+        period = self._period_q8 >> 8
+        err = ticks_diff(now, self._expected_us)  # Positive when the tick is late
+        # Limit the influence of bunched or missing ticks
+        if err > period:
+            err = period
+        elif err < -period:
+            err = -period
+
+        self._period_q8 += (err << 8) >> _FREQ_SHIFT
+        if self._period_q8 < _MIN_PERIOD_US << 8:
+            self._period_q8 = _MIN_PERIOD_US << 8
+        elif self._period_q8 > _MAX_PERIOD_US << 8:
+            self._period_q8 = _MAX_PERIOD_US << 8
+
+        self._advance()
+        self._last_us = ticks_add(self._expected_us, err >> _PHASE_SHIFT)
+        self._expected_us = ticks_add(self._last_us, self._period_q8 >> 8)
+
+    def start(self):
+        """Handle MIDI Start: rewind the song position."""
+        self.song_ticks = 0
+        self.running = True
+
+    def cont(self):
+        """Handle MIDI Continue."""
+        self.running = True
+
+    def stop(self):
+        """Handle MIDI Stop."""
+        self.running = False
+
+    def handle_realtime(self, status: int):
+        """Handler for BLEMidi.set_realtime_handler."""
+        if status == 0xF8:
+            self.clock()
+        elif status == 0xFA:
+            self.start()
+        elif status == 0xFB:
+            self.cont()
+        elif status == 0xFC:
+            self.stop()
+
+    def _phase_q8(self, now: int) -> int:
+        """Fraction of the current tick that has elapsed, 0-255."""
+        if self.locked and ticks_diff(now, self._last_us) > _LOCK_TIMEOUT_US:
+            self.locked = False
+        if not self.locked:
+            self._free_run(now)
+        elapsed = ticks_diff(now, self._last_us)
+        if elapsed <= 0:
+            return 0
+        frac = (elapsed << 8) // (self._period_q8 >> 8)
+        # While locked, hold at the end of the tick until the next clock arrives
+        return frac if frac < 255 else 255
+
+    def ticks_ms(self) -> int:
+        """
+        Get the current beat time in milliseconds at the reference tempo.
+        Compatible with time.ticks_diff and time.ticks_add.
+        """
+        frac_us = (self._phase_q8(ticks_us()) * self._ref_tick_us) >> 8
+        return ticks_add(self._ms, (self._rem_us + frac_us) // 1000)
+
+    def position_q8(self) -> int:
+        """Get the song position since Start in ticks, as Q.8 fixed point."""
+        frac = self._phase_q8(ticks_us())
+        return (self.song_ticks << 8) + frac if self.running else self.song_ticks << 8
+
+    def bpm(self) -> float:
+        """Get the estimated tempo in beats per minute."""
+        return 60000000 * 256 / (self._period_q8 * PPQN)
+
+    def beat_us(self) -> int:
+        """Get the estimated length of one beat in microseconds."""
+        return (self._period_q8 * PPQN) >> 8
+
+    def beats(self, count) -> int:
+        """
+        Convert a number of beats to milliseconds of beat time, for animation durations
+        and song event times.
+        """
+        return int(count * 60000 // self.ref_bpm)
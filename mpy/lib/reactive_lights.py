@@ -0,0 +1,258 @@
+from micropython import const
+
+from lib.animations import WipeAnimation, SingleBlockWipeAnimation, ColorTransitionAnimation
+from lib.frame_cache import BakedAnimation
+from lib.light_manager import AnimationPool
+from lib.timeline import EFFECT_FILL, EFFECT_WIPE, EFFECT_BLOCK
+
+_QUEUE_SIZE = const(16)
+_BAKE_QUEUE_SIZE = const(4)
+_ANY_SEGMENT = const(255)  # Segment chosen from the pitch
+
+
+def hue_to_rgb(hue: int, value: int = 255) -> tuple:
+    """Convert a hue in degrees (0-359) at full saturation to an (r, g, b) color."""
+    region = hue // 60
+    f = (hue % 60) * 255 // 60
+    q = value * (255 - f) // 255
+    t = value * f // 255
+    if region == 0:
+        return value, t, 0
+    if region == 1:
+        return q, value, 0
+    if region == 2:
+        return 0, value, t
+    if region == 3:
+        return 0, q, value
+    if region == 4:
+        return t, 0, value
+    return value, 0, q
+
+
+class Preset:
+    """How a note lights its segment: the note-on effect, the release and the colors."""
+    def __init__(self, effect: int, attack_ms: int, release_ms: int = 0, colors: list = None,
+                 block_length: int = 3, min_level: int = 40):
+        """
+        Initialize a preset.
+        - effect: EFFECT_WIPE, EFFECT_BLOCK or EFFECT_FILL, played on note on.
+        - attack_ms: Duration of the note-on effect. EFFECT_FILL with 0 lights the segment at once.
+        - release_ms: Fade to black on note off, or 0 to leave the segment to the note-on effect.
+        - colors: (r, g, b) colors of the 12 pitch classes starting at C, a hue wheel if None.
+        - block_length: Block size in LEDs for EFFECT_BLOCK.
+        - min_level: Intensity of the softest note, 0-255.
+        """
+        self.effect = effect
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.colors = colors or [hue_to_rgb(i * 30) for i in range(12)]
+        self.block_length = block_length
+        self.min_level = min_level
+
+
+PRESETS = [
+    Preset(EFFECT_WIPE, 400, 400),  # Wipe in, fade out on release
+    Preset(EFFECT_BLOCK, 300),  # A spark runs along the finger
+    Preset(EFFECT_FILL, 0, 600),  # Flash on, slow fade on release
+]
+
+
+class _NoteQueue:
+    """Fixed-size ring of note events, written by one context and read by the frame hook."""
+    def __init__(self, size: int):
+        self._notes = bytearray(size)
+        self._velocities = bytearray(size)
+        self._segments = bytearray(size)
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+
+    def push(self, note: int, velocity: int, segment: int) -> bool:
+        tail = self._tail
+        nxt = (tail + 1) % len(self._notes)
+        if nxt == self._head:
+            self.dropped += 1
+            return False
+        self._notes[tail] = note
+        self._velocities[tail] = velocity
+        self._segments[tail] = segment
+        self._tail = nxt  # Publish only once the slot is filled
+        return True
+
+
+class ReactiveLights:
+    """
+    Turns note events into LightManager animations.
+
+    Pitch selects a color from a table of all 128 MIDI notes, built once per preset
+    from the pitch-class colors and brightened towards higher octaves. Velocity selects
+    an intensity from a 128-entry curve. Animations come from preallocated pools.
+
+    Notes are queued and started at the beginning of the next LED frame, through
+    LightManager.on_frame. Notes from the main loop and from interrupt handlers such
+    as BLE MIDI go through separate queues, so they never race each other or the
+    render timer.
+
+    With a frame cache, wipes play from a baked clip when one exists. A miss plays the
+    wipe live and queues the clip, which bake_pending bakes later from the main loop,
+    so the render timer never bakes or allocates clips.
+    """
+
+    def __init__(self, lm, preset: int = 0, frame_cache=None, pool_size: int = 8):
+        """
+        Initialize the engine and hook it into the light manager's frames.
+        - lm: LightManager to light.
+        - preset: Index into PRESETS.
+        - frame_cache: Optional FrameCache to play wipes from pre-rendered frames.
+        - pool_size: Number of preallocated animations of each kind.
+        """
+        self.lm = lm
+        self.frame_cache = frame_cache
+        self._wipes = AnimationPool(WipeAnimation, pool_size)
+        self._blocks = AnimationPool(SingleBlockWipeAnimation, pool_size)
+        self._fades = AnimationPool(ColorTransitionAnimation, pool_size)
+        self._baked = AnimationPool(BakedAnimation, pool_size)
+        self._queue = _NoteQueue(_QUEUE_SIZE)
+        self._irq_queue = _NoteQueue(_QUEUE_SIZE)
+        # Wipes to bake from the main loop, written by the frame hook
+        self._bake_lengths = bytearray(_BAKE_QUEUE_SIZE)
+        self._bake_durations = [0] * _BAKE_QUEUE_SIZE
+        self._bake_colors = [None] * _BAKE_QUEUE_SIZE
+        self._bake_head = 0
+        self._bake_tail = 0
+        self._bake_wipe = WipeAnimation()
+        self._colors = bytearray(128 * 3)
+        self._levels = bytearray(128)
+        self.set_preset(preset)
+        lm.on_frame = self.update
+
+    def set_preset(self, index: int):
+        """Select a preset and rebuild the note color and velocity tables."""
+        preset = PRESETS[index]
+        self.preset = preset
+        colors = self._colors
+        for note in range(128):
+            r, g, b = preset.colors[note % 12]
+            # 60% brightness at the bottom of the keyboard up to 100% at the top
+            k = 154 + note * 102 // 127
+            o = note * 3
+            colors[o] = r * k >> 8
+            colors[o + 1] = g * k >> 8
+            colors[o + 2] = b * k >> 8
+        floor = preset.min_level
+        for velocity in range(128):
+            self._levels[velocity] = floor + (255 - floor) * velocity * velocity // (127 * 127)
+
+    def note_on(self, note: int, velocity: int = 127, segment: int = -1, irq: bool = False) -> bool:
+        """
+        Queue a note on. Returns False if the queue is full.
+        - segment: Segment to light, or -1 to pick one from the pitch.
+        - irq: True when called from an interrupt handler rather than the main loop.
+        """
+        queue = self._irq_queue if irq else self._queue
+        return queue.push(note, velocity, _ANY_SEGMENT if segment < 0 else segment)
+
+    def note_off(self, note: int, segment: int = -1, irq: bool = False) -> bool:
+        """Queue a note off, see note_on."""
+        queue = self._irq_queue if irq else self._queue
+        return queue.push(note, 0, _ANY_SEGMENT if segment < 0 else segment)
+
+    def handle_midi(self, status: int, note: int, velocity: int):
+        """Handler for BLEMidi.set_note_handler, lights notes received over BLE."""
+        if status & 0xF0 == 0x90:
+            self.note_on(note, velocity, irq=True)
+        else:
+            self.note_off(note, irq=True)
+
+    def update(self):
+        """Start the animations of the queued notes. Called by LightManager at the start of a frame."""
+        self._drain(self._queue)
+        self._drain(self._irq_queue)
+
+    def _drain(self, queue: _NoteQueue):
+        head = queue._head
+        size = len(queue._notes)
+        while head != queue._tail:
+            segment = queue._segments[head]
+            note = queue._notes[head]
+            if segment == _ANY_SEGMENT or segment >= self.lm.segment_count:
+                segment = note % self.lm.segment_count
+            velocity = queue._velocities[head]
+            if velocity:
+                self._start(note, velocity, segment)
+            else:
+                self._release(segment)
+            head = (head + 1) % size
+        queue._head = head
+
+    def _start(self, note: int, velocity: int, segment: int):
+        """Play the preset's note-on effect on a segment."""
+        preset = self.preset
+        lm = self.lm
+        level = self._levels[velocity]
+        t = self._colors
+        o = note * 3
+        color = (t[o] * level >> 8, t[o + 1] * level >> 8, t[o + 2] * level >> 8)
+        start = lm.get_segment_start(segment)
+        length = lm.get_segment_length(segment)
+
+        if preset.effect == EFFECT_WIPE:
+            anim = self._wipes.acquire()
+            if anim is None:
+                return
+            anim.setup(start, length, preset.attack_ms, color)
+            if self.frame_cache is not None:
+                clip = self.frame_cache.lookup(anim)
+                if clip is None:
+                    self._queue_bake(length, preset.attack_ms, color)
+                else:
+                    baked = self._baked.acquire()
+                    if baked is not None:
+                        baked.setup(start, clip)
+                        self._wipes.release(anim)
+                        anim = baked
+        elif preset.effect == EFFECT_BLOCK:
+            anim = self._blocks.acquire()
+            if anim is None:
+                return
+            anim.setup(start, length, preset.block_length, preset.attack_ms, color)
+        else:
+            anim = self._fades.acquire()
+            if anim is None:
+                return
+            anim.setup(start, length, preset.attack_ms, color)
+        lm.add_animation(anim)
+
+    def _queue_bake(self, length: int, duration_ms: int, color: tuple):
+        """Ask the main loop to bake a wipe, dropped if the queue is full."""
+        tail = self._bake_tail
+        nxt = (tail + 1) % _BAKE_QUEUE_SIZE
+        if nxt == self._bake_head:
+            return
+        self._bake_lengths[tail] = length
+        self._bake_durations[tail] = duration_ms
+        self._bake_colors[tail] = color
+        self._bake_tail = nxt  # Publish only once the slot is filled
+
+    def bake_pending(self):
+        """Bake the wipes that missed the frame cache. Call from the main loop, not the render timer."""
+        if self.frame_cache is None:
+            return
+        head = self._bake_head
+        while head != self._bake_tail:
+            wipe = self._bake_wipe
+            wipe.setup(0, self._bake_lengths[head], self._bake_durations[head], self._bake_colors[head])
+            self._bake_colors[head] = None
+            self.frame_cache.clip_for(wipe)
+            head = (head + 1) % _BAKE_QUEUE_SIZE
+        self._bake_head = head
+
+    def _release(self, segment: int):
+        """Fade a segment out if the preset has a release."""
+        if not self.preset.release_ms:
+            return
+        anim = self._fades.acquire()
+        if anim is not None:
+            anim.setup(self.lm.get_segment_start(segment), self.lm.get_segment_length(segment),
+                       self.preset.release_ms, (0, 0, 0))
+            self.lm.add_animation(anim)
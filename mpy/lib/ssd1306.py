@@ -23,6 +23,8 @@ SET_PRECHARGE = const(0xD9)
 SET_VCOM_DESEL = const(0xDB)
 SET_CHARGE_PUMP = const(0x8D)
 
+_MIN_PIECE = const(8)  # Smallest piece show_step sends, each one costs an address window
+
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
@@ -33,6 +35,17 @@ class SSD1306(framebuf.FrameBuffer):
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        # Copy of the display RAM contents, show only sends what differs from it
+        self._shadow = bytearray(len(self.buffer))
+        self._buf_mv = memoryview(self.buffer)
+        self._shadow_mv = memoryview(self._shadow)
+        # Per-page views, so comparing a page allocates nothing
+        self._buf_pages = self._page_views(self._buf_mv)
+        self._shadow_pages = self._page_views(self._shadow_mv)
+        self._full = True
+        self._front = None  # Snapshot for chunked flushes, allocated on first use
+        self.flushing = False
+        self.bytes_sent = 0
         self.init_display()
 
     def init_display(self):
@@ -85,10 +98,101 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
+    def invalidate(self):
+        # Send the whole buffer on the next show, e.g. after the display was reset
+        self._full = True
+
     def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
+        # Only send the pages that changed since the last show, narrowed to the changed
+        # columns. Runs of changed pages are sent through one address window.
+        self.flushing = False  # Supersedes a chunked flush in progress
+        width = self.width
+        pages = self.pages
+        if self._full:
+            self._full = False
+            self._send(self._buf_mv, 0, pages - 1, 0, width - 1)
+            return
+        buf = self._buf_mv
+        first_page = -1
+        c0 = width
+        c1 = -1
+        for page in range(pages + 1):
+            last = -1
+            if page < pages:
+                first, last = self._dirty_columns(self.buffer, self._buf_pages, page)
+                if first < c0:
+                    c0 = first
+            if last >= 0:
+                if first_page < 0:
+                    first_page = page
+                if last > c1:
+                    c1 = last
+            elif first_page >= 0:
+                self._send(buf, first_page, page - 1, c0, c1)
+                first_page = -1
+                c0 = width
+                c1 = -1
+
+    def start_show(self):
+        # Snapshot the buffer and start a flush sent piece by piece with show_step.
+        # Drawing can go on meanwhile, only the snapshot is sent.
+        if self._front is None:
+            self._front = bytearray(len(self.buffer))
+            self._front_mv = memoryview(self._front)
+            self._front_pages = self._page_views(self._front_mv)
+        self._front[:] = self.buffer
+        if self._full:
+            self._full = False
+            # Make every byte differ from the snapshot so all of it is sent
+            shadow = self._shadow
+            for j in range(len(shadow)):
+                shadow[j] = self._front[j] ^ 0xFF
+        self._page = 0
+        self.flushing = True
+
+    def show_step(self, max_bytes=128):
+        # Send the next changed piece of the snapshot, at most max_bytes of data in
+        # one window. Returns False once the whole snapshot has been sent.
+        if max_bytes < _MIN_PIECE:
+            max_bytes = _MIN_PIECE
+        while self.flushing and self._page < self.pages:
+            page = self._page
+            c0, c1 = self._dirty_columns(self._front, self._front_pages, page)
+            if c1 >= 0:
+                if c1 - c0 >= max_bytes:
+                    c1 = c0 + max_bytes - 1
+                self._send(self._front_mv, page, page, c0, c1)
+                return True
+            self._page += 1
+        self.flushing = False
+        return False
+
+    def _page_views(self, mv):
+        width = self.width
+        return [mv[p * width:(p + 1) * width] for p in range(self.pages)]
+
+    def _dirty_columns(self, src, src_pages, page):
+        # Changed columns of a page of src as (first, last), last is -1 if unchanged.
+        # The whole page is compared first, only a changed page is scanned byte by byte.
+        width = self.width
+        if src_pages[page] == self._shadow_pages[page]:
+            return width, -1
+        shadow = self._shadow
+        o = page * width
+        first = o
+        while src[first] == shadow[first]:
+            first += 1
+        last = o + width - 1
+        while src[last] == shadow[last]:
+            last -= 1
+        return first - o, last - o
+
+    def _send(self, src, p0, p1, c0, c1):
+        # Write pages p0..p1, columns c0..c1 of src through the column and page address window
+        width = self.width
+        x0 = c0
+        x1 = c1
+        if width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
@@ -96,9 +200,21 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(x0)
         self.write_cmd(x1)
         self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(p0)
+        self.write_cmd(p1)
+        if c0 == 0 and c1 == width - 1:
+            # Full-width rows are contiguous in the buffer
+            o = p0 * width
+            end = (p1 + 1) * width
+            self.write_data(src[o:end])
+            self._shadow_mv[o:end] = src[o:end]
+            self.bytes_sent += end - o
+            return
+        for page in range(p0, p1 + 1):
+            o = page * width
+            self.write_data(src[o + c0:o + c1 + 1])
+            self._shadow_mv[o + c0:o + c1 + 1] = src[o + c0:o + c1 + 1]
+            self.bytes_sent += c1 - c0 + 1
 
 
 class SSD1306_I2C(SSD1306):
@@ -0,0 +1,226 @@
+from array import array
+from micropython import const
+from struct import pack_into, unpack_from
+from time import ticks_diff, ticks_add
+
+from lib.light_manager import BLEND_REPLACE, now_ms, pack_color
+
+# Effects an event can play on its segment
+EFFECT_FILL = const(0)  # Solid color for the whole event
+EFFECT_WIPE = const(1)  # Color wipes across the segment
+EFFECT_BLOCK = const(2)  # Single block flies across the segment
+EFFECT_FADE = const(3)  # Solid color fading out to black
+
+_HEADER = "<HHB"  # event count, block length, palette size
+_HEADER_SIZE = const(5)
+
+
+def _bisect_right(values, x: int, hi: int) -> int:
+    """Return the index after the last value <= x in the sorted values[:hi]."""
+    lo = 0
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if values[mid] <= x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class Timeline:
+    """
+    Compact, compiled light show.
+
+    Events are stored as flat arrays sorted by start time: start (ms), duration (ms),
+    segment, effect id and palette color index, 11 bytes per event. A show of a few
+    hundred notes fits in a few KB and can be saved to and loaded from flash with
+    `to_bytes` and `from_bytes`.
+    """
+
+    def __init__(self, events, palette: list, block_length: int = 5):
+        """
+        Compile a list of events.
+
+        Args:
+            events (iterable): (start_ms, duration_ms, segment, effect, color_index) tuples, in any order.
+            palette (list): (r, g, b) colors referenced by color_index.
+            block_length (int): Block size in LEDs for EFFECT_BLOCK.
+        """
+        events = sorted(events, key=lambda e: e[0])
+        n = len(events)
+        self.palette = palette
+        self.block_length = block_length
+        self.starts = array("I", [0] * n)
+        self.durations = array("I", [0] * n)
+        self.segments = bytearray(n)
+        self.effects = bytearray(n)
+        self.colors = bytearray(n)
+        for i in range(n):
+            start, duration, segment, effect, color = events[i]
+            self.starts[i] = start
+            self.durations[i] = duration
+            self.segments[i] = segment
+            self.effects[i] = effect
+            self.colors[i] = color
+        self._index()
+
+    def _index(self):
+        """Compute the values the runtime needs for its search window."""
+        self.max_duration = max(self.durations) if len(self.durations) else 0
+        self.length_ms = 0
+        for i in range(len(self.starts)):
+            end = self.starts[i] + self.durations[i]
+            if end > self.length_ms:
+                self.length_ms = end
+
+    def __len__(self):
+        return len(self.starts)
+
+    def to_bytes(self) -> bytearray:
+        """Serialize the timeline, e.g. to store a show in flash."""
+        n = len(self.starts)
+        size = _HEADER_SIZE + 3 * len(self.palette) + 11 * n
+        data = bytearray(size)
+        pack_into(_HEADER, data, 0, n, self.block_length, len(self.palette))
+        o = _HEADER_SIZE
+        for color in self.palette:
+            data[o:o + 3] = bytes(color[:3])
+            o += 3
+        data[o:o + 4 * n] = bytes(self.starts)
+        o += 4 * n
+        data[o:o + 4 * n] = bytes(self.durations)
+        o += 4 * n
+        data[o:o + n] = self.segments
+        data[o + n:o + 2 * n] = self.effects
+        data[o + 2 * n:o + 3 * n] = self.colors
+        return data
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a timeline serialized with to_bytes."""
+        n, block_length, palette_size = unpack_from(_HEADER, data, 0)
+        o = _HEADER_SIZE
+        palette = []
+        for i in range(palette_size):
+            palette.append((data[o], data[o + 1], data[o + 2]))
+            o += 3
+        timeline = cls((), palette, block_length)
+        timeline.starts = array("I", bytearray(data[o:o + 4 * n]))
+        o += 4 * n
+        timeline.durations = array("I", bytearray(data[o:o + 4 * n]))
+        o += 4 * n
+        timeline.segments = bytearray(data[o:o + n])
+        timeline.effects = bytearray(data[o + n:o + 2 * n])
+        timeline.colors = bytearray(data[o + 2 * n:o + 3 * n])
+        timeline._index()
+        return timeline
+
+
+class TimelinePlayer:
+    """
+    Plays a Timeline on a LightManager.
+
+    Every frame is evaluated from the current show time alone: a binary search finds
+    the events that can be active, so playing, seeking and scrubbing all cost
+    O(log n) plus the number of active events.
+    """
+    pool = None  # Players are never pooled
+    spans_segments = True
+    segment = -1
+    blend = BLEND_REPLACE
+    z = 0
+
+    def __init__(self, timeline: Timeline, lm, replay_count: int = 1):
+        """
+        Initialize a player.
+        - timeline: Compiled Timeline to play.
+        - lm: LightManager the segments of the timeline refer to.
+        - replay_count: Number of times to play the show (0 for infinite).
+        """
+        self.timeline = timeline
+        self.replay_count = replay_count
+        self.current_replay = 0
+        self.segment_starts = [lm.get_segment_start(i) for i in range(lm.segment_count)]
+        self.segment_lengths = [lm.get_segment_length(i) for i in range(lm.segment_count)]
+        self._colors = None  # Palette packed in strip byte order, built on first update
+        self._bpp = 0
+        self.start_time = now_ms()
+        self.reset()
+
+    def reset(self):
+        """Play the show from the beginning."""
+        self.start_time = now_ms()
+        self.current_replay += 1
+
+    def invalidate(self):
+        """Nothing to forget, every frame is drawn in full."""
+        pass
+
+    def seek(self, position_ms: int):
+        """Jump to a position in the show."""
+        self.start_time = ticks_add(now_ms(), -position_ms)
+
+    def position(self) -> int:
+        """Return the current show time in milliseconds."""
+        return ticks_diff(now_ms(), self.start_time)
+
+    def update(self, np) -> bool:
+        """Render the show at the current time. Return False when finished."""
+        tl = self.timeline
+        t = ticks_diff(now_ms(), self.start_time)
+        if t >= tl.length_ms:
+            self.render(np, tl.length_ms)
+            if self.replay_count == 0 or self.current_replay < self.replay_count:
+                self.reset()
+                return True
+            return False
+        self.render(np, t)
+        return True
+
+    def render(self, np, t: int):
+        """Draw every event active at show time t."""
+        tl = self.timeline
+        bpp = np.bpp
+        if self._colors is None or self._bpp != bpp:
+            self._colors = [pack_color(c, np.ORDER, bpp) for c in tl.palette]
+            self._faded = bytearray(bpp)
+            self._bpp = bpp
+        colors = self._colors
+        segment_starts = self.segment_starts
+        segment_lengths = self.segment_lengths
+
+        for i in range(len(segment_starts)):
+            np.fill_range(segment_starts[i], segment_lengths[i])
+
+        # Only events starting in (t - max_duration, t] can be active
+        starts = tl.starts
+        hi = _bisect_right(starts, t, len(starts))
+        lo = _bisect_right(starts, t - tl.max_duration, hi)
+        for i in range(lo, hi):
+            duration = tl.durations[i]
+            elapsed = t - starts[i]
+            if elapsed >= duration:
+                continue
+            segment = tl.segments[i]
+            seg_start = segment_starts[segment]
+            length = segment_lengths[segment]
+            color = colors[tl.colors[i]]
+            effect = tl.effects[i]
+            if effect == EFFECT_BLOCK:
+                block = tl.block_length
+                first = elapsed * (length + block) // duration - block
+                end = min(first + block, length)
+                first = max(first, 0)
+                if end > first:
+                    np.fill_range(seg_start + length - end, end - first, color)
+            elif effect == EFFECT_WIPE:
+                step = elapsed * length // duration
+                np.fill_range(seg_start, min(step + 1, length), color)
+            elif effect == EFFECT_FADE:
+                k = ((duration - elapsed) << 8) // duration
+                faded = self._faded
+                for j in range(bpp):
+                    faded[j] = (color[j] * k) >> 8
+                np.fill_range(seg_start, length, faded)
+            else:
+                np.fill_range(seg_start, length, color)
@@ -0,0 +1,152 @@
+from array import array
+from machine import UART, Timer
+from micropython import const
+from time import ticks_us
+
+POSITION_MASK = const(0x3FFFFFFF)  # Stream positions wrap like PacketParser.position
+_POSITION_HALF = const(0x20000000)
+_SCRATCH_SIZE = const(64)
+
+
+class UartRx:
+    """
+    Receives a UART into a ring buffer from an interrupt, so bytes keep arriving
+    while the main loop is busy with the display or the LEDs.
+
+    The handler runs on UART.IRQ_RXIDLE, when the line goes quiet after a burst,
+    or from a timer on ports without it. It copies what the UART holds into the
+    ring and records the burst's ticks_us against the stream position it ended at,
+    so a reader can tell when each packet arrived with stamp(). Bytes that do not
+    fit are dropped and counted in lost_bytes.
+
+    The reader side has the any() and readinto() of a UART, so it can stand in for
+    one, e.g. for PacketParser.fill. One context writes and one reads, no locking.
+    """
+
+    def __init__(self, uart, size: int = 1024, marks: int = 16):
+        """
+        Initialize the receiver, call start to begin receiving.
+        - uart: UART to read.
+        - size: Ring size in bytes, room for the bursts of the longest main loop pass.
+        - marks: Number of bursts whose arrival time is kept.
+        """
+        self.uart = uart
+        self._data = bytearray(size)
+        self._head = 0  # Written by the handler
+        self._tail = 0  # Read by the reader
+        self._scratch = bytearray(_SCRATCH_SIZE)
+        self._mark_end = array('l', [0] * marks)  # Stream position after each burst
+        self._mark_us = array('l', [0] * marks)
+        self._mark_head = 0
+        self._mark_tail = 0
+        self._timer = None
+        self.written = 0  # Stream position of the next byte received, wraps at POSITION_MASK
+        self.last_us = ticks_us()
+        self.lost_bytes = 0
+        self.overflows = 0  # Bursts that did not fit whole, each breaks at least one packet
+
+    def start(self, timer_id: int = None, period_ms: int = 5):
+        """
+        Start receiving from the UART's RX idle interrupt, or from a timer if the port has none.
+        - timer_id: Use this timer even if RX idle is available.
+        - period_ms: Timer period, short enough for the UART's hardware buffer not to fill up.
+        """
+        self.stop()
+        if timer_id is None and hasattr(UART, "IRQ_RXIDLE"):
+            self.uart.irq(self._irq, UART.IRQ_RXIDLE)
+        else:
+            self._timer = Timer(timer_id if timer_id is not None else 2)
+            self._timer.init(mode=Timer.PERIODIC, period=period_ms, callback=self._irq)
+
+    def stop(self):
+        """Stop receiving, the UART can be read directly again."""
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        elif hasattr(UART, "IRQ_RXIDLE"):
+            self.uart.irq(None)
+
+    def _irq(self, source):
+        """Interrupt handler, moves the UART's bytes into the ring and marks the burst."""
+        uart = self.uart
+        if not uart.any():
+            return
+        now = ticks_us()
+        data = self._data
+        size = len(data)
+        scratch = self._scratch
+        head = self._head
+        received = 0
+        lost = 0
+        while uart.any():
+            n = uart.readinto(scratch)
+            if not n:
+                break
+            free = (self._tail - head - 1) % size
+            if n > free:
+                lost += n - free
+                n = free
+            for i in range(n):
+                data[head] = scratch[i]
+                head += 1
+                if head == size:
+                    head = 0
+            received += n
+        self._head = head  # Publish once the bytes are in place
+        if lost:
+            self.lost_bytes += lost
+            self.overflows += 1
+        if not received:
+            return
+        self.written = (self.written + received) & POSITION_MASK
+        self.last_us = now
+        mark = self._mark_head
+        nxt = (mark + 1) % len(self._mark_end)
+        if nxt == self._mark_tail:
+            # No room for another burst, extend the newest one
+            mark = (mark - 1) % len(self._mark_end)
+            self._mark_end[mark] = self.written
+            self._mark_us[mark] = now
+            return
+        self._mark_end[mark] = self.written
+        self._mark_us[mark] = now
+        self._mark_head = nxt
+
+    def any(self) -> int:
+        """Number of bytes waiting in the ring."""
+        return (self._head - self._tail) % len(self._data)
+
+    def readinto(self, buf) -> int:
+        """Move up to len(buf) bytes from the ring into buf, returns the count like UART.readinto."""
+        data = self._data
+        size = len(data)
+        tail = self._tail
+        n = min(len(buf), (self._head - tail) % size)
+        for i in range(n):
+            buf[i] = data[tail]
+            tail += 1
+            if tail == size:
+                tail = 0
+        self._tail = tail
+        return n
+
+    def stamp(self, position: int) -> int:
+        """
+        ticks_us of the burst that delivered the byte before a stream position, such as the
+        end of a packet. Positions must be asked for in increasing order, older bursts are freed.
+        """
+        marks = len(self._mark_end)
+        tail = self._mark_tail
+        while tail != self._mark_head:
+            if (self._mark_end[tail] - position) & POSITION_MASK < _POSITION_HALF:
+                self._mark_tail = tail
+                return self._mark_us[tail]
+            tail = (tail + 1) % marks
+        self._mark_tail = tail
+        return self.last_us
+
+    def reset(self):
+        """Drop the buffered bytes and bursts, e.g. after the baud rate changed. Call while stopped."""
+        self._tail = self._head
+        self._mark_tail = self._mark_head
+        self.written = 0
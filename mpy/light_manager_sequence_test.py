@@ -27,6 +27,11 @@ delays = [
 
 lm.add_sequence(animations, delays, replay_count=5)
 
+t = time.ticks_ms()
 while True:
     lm.update()
-    time.sleep(0.1)
\ No newline at end of file
+    time.sleep(0.1)
+    if time.ticks_diff(time.ticks_ms(), t) >= 5000:
+        print("frames written:", lm.frames_written, "skipped:", lm.frames_skipped)
+        lm.reset_frame_stats()
+        t = time.ticks_ms()
\ No newline at end of file
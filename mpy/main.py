@@ -1,16 +1,18 @@
 import time
 from machine import Pin, I2C
-from random import choice
 import bluetooth
 import neopixel
-from lib.jy901b import JY901B
+from lib.jy901b import JY901B, PACKET_ACCELERATION, PACKET_QUATERNION, PITCH, X, Z
 from lib.ble_midi_instrument import BLEMidi, NOTE
 from lib.flex_mapper import FlexSensorMapper
 from lib.fake_flex_mapper import FakeFlexSensorMapper
-from internationale import the_internationale
-from lib.display_manager import DisplayManager
-from lib.light_manager import LightManager
-from lib.animations import WipeAnimation, ColorTransitionAnimation
+from internationale import the_internationale, BPM
+from lib.display_manager import DisplayManager, PAGE_PLAY, PAGE_GRAPH
+from lib.light_manager import LightManager, set_time_source
+from lib.frame_cache import FrameCache
+from lib.reactive_lights import ReactiveLights
+from lib.arpeggiator import Arpeggiator, ARP_UP_DOWN
+from lib.midi_clock import MidiClock
 
 Pin(13,Pin.OUT).value(1)
 Pin(14,Pin.OUT).value(0)
@@ -25,13 +27,18 @@ ble = bluetooth.BLE()
 
 led = neopixel.NeoPixel(Pin(38, Pin.OUT), 1)
 imu = JY901B(uart_id=1, baudrate=9600, tx_pin=7, rx_pin=8)
+IMU_RATE_HZ = 100  # Angle updates per second, for responsive window switching
+IMU_FALLBACK_HZ = 20  # What three packet types can reach at 9600 baud
 midi = BLEMidi(ble, name="MIDIMitts")
+# Beat time at the demo song's tempo, follows the DAW's MIDI clock when one is received
+clock = MidiClock(ref_bpm=BPM)
+set_time_source(clock.ticks_ms)
 if not fake_on:
     #mapper = FlexSensorMapper(sensor_pins=[5, 4, 3, 2, 1], thresholds=(20, 25, 35, 30, 38)) # left
     mapper = FlexSensorMapper(sensor_pins=[1, 2, 3, 4, 5], thresholds=(20, 35, 30, 35, 35)) # right
     #mapper = FlexSensorMapper(sensor_pins=[5, 4, 3, 2, 1], thresholds=(0.5,0.5,0.5,0.5,0.5))
 else:
-    mapper = FakeFlexSensorMapper()
+    mapper = FakeFlexSensorMapper(clock=clock)
 ode_to_joy = [
         ('E4', 800), ('E4', 800), ('F4', 800), ('G4', 800),
         ('G4', 800), ('F4', 800), ('E4', 800), ('D4', 800),
@@ -42,35 +49,59 @@ ode_to_joy = [
         ('C4', 800), ('C4', 800), ('D4', 800), ('E4', 800),
         ('D4', 600), ('C4', 200), ('C4', 1000),
     ]
-disp = DisplayManager(i2c)
-lm = LightManager(Pin(9, Pin.OUT), total_count = 25, segment_count = 5)
+disp = DisplayManager(i2c, precision=0, chunk_bytes=128)  # Whole degrees, so sensor noise does not redraw the header
+# The OLED is flushed from a timer in 128-byte pieces, a full frame within 80 ms instead of over many loop passes
+show_graph = False  # Plot the flex sensors and the pitch instead of the keyboard, to tune thresholds
+GRAPH_ANGLE = PITCH  # IMU angle plotted below the flex sensors, PITCH or ROLL
+LED_MAX_MA = 800  # Current budget of the strip on the glove battery
+lm = LightManager(Pin(9, Pin.OUT), total_count = 25, segment_count = 5, max_ma = LED_MAX_MA)
+LED_FPS = 50
 
-palette  = [
-    (100,0,0),
-    (0,100,0),
-    (0,0,100),
-    (255, 99, 71),  # tomato red
-    (135, 206, 235),  # sky blue
-    (255, 215, 0),  # gold
-    (60, 179, 113),  # medium sea green
-]
+# Play wipes from pre-rendered frames. Clips are cached by exact color, so this only pays off
+# when notes repeat with the same velocity; wipes already redraw only their new pixels.
+bake_animations = False
+frame_cache = FrameCache(max_bytes=4096)
+# Note colors and effects for played notes, the demo song, the arpeggiator and notes received over BLE
+lights = ReactiveLights(lm, preset=0, frame_cache=frame_cache if bake_animations else None)
+midi.set_note_handler(lights.handle_midi)
 
 
+arp_on = False  # Held fingers drive the arpeggiator instead of playing notes directly
 
-def handle_imu_switching(angles, accel, last_switch_time, mapper, cooldown_ms=500, threshold_pitch=30, threshold_accel=5, reverse: bool = False):
-    """Handle IMU-based switching based on pitch angle, with a set cooldown. Left/right can be reversed"""
+
+def arp_step(note_number, finger):
+    """Light the finger's segment for every arpeggiator step."""
+    # Steps come from the clock timer or, with external clock, from the BLE interrupt
+    lights.note_on(note_number, arp.velocity, 4 - finger, irq=True)
+
+
+arp = Arpeggiator(midi, bpm=120, division=4, pattern=ARP_UP_DOWN, on_step=arp_step)
+
+
+def on_realtime(status):
+    """Feed incoming MIDI clock to the tempo follower and the arpeggiator."""
+    clock.handle_realtime(status)
+    arp.handle_realtime(status)
+
+
+midi.set_realtime_handler(on_realtime)
+
+
+
+def handle_imu_switching(tilt, accel_z, last_switch_time, mapper, cooldown_ms=500, threshold_tilt=16384, threshold_accel=5, reverse: bool = False):
+    """Handle IMU-based switching based on hand tilt (sine of the pitch, 16384 = 30°), with a set cooldown. Left/right can be reversed"""
     current_time = time.ticks_ms()
 
     if current_time - last_switch_time >= cooldown_ms:
-        if (angles["pitch"] >= threshold_pitch and reverse == False) or (angles["pitch"] <= -threshold_pitch and reverse == True):
+        if (tilt >= threshold_tilt and reverse == False) or (tilt <= -threshold_tilt and reverse == True):
             mapper.switch_left()
             last_switch_time = current_time
             led[0] = (0, 255, 0)
-        elif (angles["pitch"] <= -threshold_pitch and reverse == False) or (angles["pitch"] >= threshold_pitch and reverse == True):
+        elif (tilt <= -threshold_tilt and reverse == False) or (tilt >= threshold_tilt and reverse == True):
             mapper.switch_right()
             last_switch_time = current_time
             led[0] = (255, 0, 0)
-        elif abs(accel["az"]-9.8) >= threshold_accel:
+        elif abs(accel_z-9.8) >= threshold_accel:
             mapper.toggle_black_white()
             last_switch_time = current_time
             led[0] = (0, 0, 255)
@@ -82,14 +113,38 @@ def handle_imu_switching(angles, accel, last_switch_time, mapper, cooldown_ms=50
 
 
 def initialize():
-    imu.set_output_types(["angles","acceleration"])
+    if imu.detect_baudrate() is None:
+        print("No IMU packets received")
+    # Switching uses the tilt from the quaternion, which has no gimbal singularity;
+    # the angles are only shown on the display
+    imu.set_output_types(["quaternion","angles","acceleration"])
+    if imu.set_baudrate(imu.required_baudrate(IMU_RATE_HZ)):
+        imu.set_output_rate(IMU_RATE_HZ)
+    else:
+        print("IMU stays at %d baud" % imu.baudrate)
+        imu.set_output_rate(IMU_FALLBACK_HZ)
     imu.save_settings()
+    if arp_on:
+        arp.start()
+        arp.start_clock()  # Steps are timed from a hardware timer, not this loop's passes
     # Flex sensor calibration is handled in FlexSensorMapper.__init__
 
 
 def main():
     last_switch_time = 0  # Initialize the time of the last switch
     has_started = False
+    lm.start_render(fps=LED_FPS)  # LEDs are rendered from a timer, independently of this loop
+    imu.start_irq()  # IMU packets are received while the loop is busy flushing the OLED
+    disp.start_background()
+    shown_keys = None
+    key_notes = []
+    # Flex lanes span twice their threshold, the dotted line marks the threshold
+    flex_sensors = getattr(mapper, 'flex_sensors', [])
+    for lane, threshold in enumerate(getattr(mapper, 'thresholds', ())):
+        disp.graph.set_range(lane, 0, 2 * threshold, threshold)
+    disp.graph.set_range(disp.graph.lanes - 1, -90, 90, 0)
+    samples = [0] * disp.graph.lanes
+    disp.show_page(PAGE_GRAPH if show_graph else PAGE_PLAY)
     while True:
         if fake_on and (not has_started) and (not fake_control_pin.value()):
             has_started = True
@@ -100,13 +155,10 @@ def main():
             continue
         else:
             led[0]=(0,0,0)
-        primary_top = ""
-        primary_bottom = ""
         footer = ""
 
         imu.update()
-        angles = imu.get_angles()
-        accel = imu.get_acceleration()
+        imu_ready = imu.has(PACKET_QUATERNION) and imu.has(PACKET_ACCELERATION)
 
         # Get triggered notes from the mapper
         if fake_on:
@@ -133,44 +185,56 @@ def main():
             led.write()
 
         for note in triggered_notes:
+            if arp_on:
+                try:
+                    arp.note_on(NOTE[note], mapper.get_key_mappings().index(note))
+                except ValueError:
+                    pass
+                continue
             midi.note_on(NOTE[note])
             try:
-                lm.add_animation(
-                    WipeAnimation(lm.get_segment_start(4-mapper.get_key_mappings().index(note)),lm.segment_length,400,choice(palette),)
-                )
+                lights.note_on(NOTE[note], 127, 4 - mapper.get_key_mappings().index(note))
             except ValueError:
                 pass
 
         for note in detriggered_notes:
+            if arp_on:
+                arp.note_off(NOTE[note])
+                continue
             midi.note_off(NOTE[note])
             try:
-                lm.add_animation(
-                    ColorTransitionAnimation(lm.get_segment_start(4-mapper.get_key_mappings().index(note)),lm.segment_length, 400, (0,0,0),)
-                )
+                lights.note_off(NOTE[note], 4 - mapper.get_key_mappings().index(note))
             except ValueError:
                 pass
 
-        # for note in active_notes:
-            # primary_top += (note + " ")
-
-        for note in mapper.get_key_mappings():
-            if note in active_notes:
-                primary_top += "1 "
-            else:
-                primary_top += "0 "
-            primary_bottom += (note + " ")
-
-        if angles and accel:
-            footer = str(angles['pitch'])
+        keys = mapper.get_key_mappings()
+        if keys != shown_keys:
+            # The fingers were remapped, look up the new notes once
+            shown_keys = keys
+            key_notes = [NOTE[note] for note in keys]
+            disp.draw_footer(keys[0] + "-" + keys[-1] if keys else "")
+        held = 0
+        for finger in range(len(keys)):
+            if keys[finger] in active_notes:
+                held |= 1 << finger
+
+        if imu_ready:
+            footer = imu.angle(PITCH)
             #print(footer)
-            last_switch_time = handle_imu_switching(angles, accel, last_switch_time, mapper, reverse=True)
+            last_switch_time = handle_imu_switching(-imu.up(X), imu.accel(Z), last_switch_time, mapper, reverse=True)
 
-        disp.clear()
         disp.draw_header(footer)
-        disp.draw_primary(primary_top, primary_bottom)
+        if show_graph:
+            for lane in range(len(flex_sensors)):
+                samples[lane] = flex_sensors[lane].filtered_value
+            if imu_ready:
+                samples[-1] = imu.angle(GRAPH_ANGLE)
+            disp.draw_graph(samples)
+        else:
+            disp.draw_keyboard(key_notes, held)
         disp.update()
 
-        lm.update()
+        lights.bake_pending()  # Bake wipes that missed the cache here, not in the LED timer
 
         time.sleep(0.05)
 
@@ -0,0 +1,53 @@
+from machine import Pin, I2C
+from lib.display_manager import DisplayManager
+import time
+
+# Compares the time of a full OLED flush against the partial (changed pages only) flush
+# for the main loop's screen, where only the row of held fingers changes between frames,
+# and the longest blocking write when the flush is sent in 64-byte pieces.
+
+i2c = I2C(0, sda=Pin(11), scl=Pin(10))
+disp = DisplayManager(i2c)
+oled = disp.display
+
+FRAMES = 32
+
+
+def draw(i):
+    disp.clear()
+    disp.draw_header("12.5")
+    top = ""
+    for finger in range(5):
+        top += "1 " if (i >> finger) & 1 else "0 "
+    disp.draw_primary(top, "C4 D4 E4 F4 G4")
+
+
+def run(full):
+    oled.bytes_sent = 0
+    total_us = 0
+    for i in range(FRAMES):
+        draw(i)
+        if full:
+            oled.invalidate()
+        t = time.ticks_us()
+        disp.update()
+        total_us += time.ticks_diff(time.ticks_us(), t)
+    return total_us // FRAMES, oled.bytes_sent // FRAMES
+
+
+full_us, full_bytes = run(True)
+partial_us, partial_bytes = run(False)
+print("full flush: %d us, %d bytes" % (full_us, full_bytes))
+print("partial flush: %d us, %d bytes" % (partial_us, partial_bytes))
+
+disp.chunk_bytes = 64
+disp.reset_stats()
+steps = 0
+for i in range(FRAMES):
+    draw(i)
+    disp.update()
+    steps += 1
+    while oled.flushing:
+        disp.update()
+        steps += 1
+print("chunked flush: longest blocking write %d us, %d updates per frame" % (disp.max_block_us, steps // FRAMES))
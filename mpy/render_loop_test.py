@@ -0,0 +1,26 @@
+from machine import Pin
+from lib.light_manager import LightManager
+from lib.animations import *
+import time
+
+# Renders LEDs from a 50 FPS timer while the main loop is busy with blocking work of
+# varying length, standing in for sensor reads and OLED writes, and prints the stats.
+
+lm = LightManager(Pin(9, Pin.OUT), total_count = 100, segment_count = 5, max_ma = 1000)
+lm.start_render(fps = 50)
+
+busy_ms = (5, 20, 60, 120)
+i = 0
+t = time.ticks_ms()
+while True:
+    segment = i % lm.segment_count
+    lm.add_animation(SingleBlockWipeAnimation(
+        lm.get_segment_start(segment), lm.get_segment_length(segment), 10, 1000, (0, 0, 255)))
+    time.sleep_ms(busy_ms[i % len(busy_ms)])
+    i += 1
+    if time.ticks_diff(time.ticks_ms(), t) >= 5000:
+        fps, avg_us, max_us, dropped = lm.render_report()
+        print("fps: %.1f, render avg %d us, max %d us, dropped %d, %d mA" % (
+            fps, avg_us, max_us, dropped, lm.frame_ma))
+        lm.reset_render_stats()
+        t = time.ticks_ms()